@@ -1,9 +1,15 @@
 import os
-import requests
-from requests.auth import HTTPBasicAuth
+import argparse
+from utils import http_client, async_engine, token_pool, quick_scan
+from utils.common import apply_concurrency_settings, get_project_names
 import pandas as pd
 import credentials
 
+parser = argparse.ArgumentParser(description="Inventory the collections listed in collection_input_form.xlsx")
+parser.add_argument('--quick', action='store_true',
+                    help="write one sizing sheet per collection from Git repository metadata only")
+args = parser.parse_args()
+
 # Read the Excel file
 excel_file = 'collection_input_form.xlsx'
 df = pd.read_excel(excel_file, sheet_name='Sheet1')
@@ -14,6 +20,9 @@ urls = df['Server URL'].dropna().tolist()  # Drop any NaN values and convert to
 # Remove any leading or trailing whitespace from URLs
 urls = [url.strip() for url in urls]
 
+# Optional per-server request caps
+apply_concurrency_settings(df)
+
 # Access Tokens
 pats = credentials.PAT
 
@@ -26,11 +35,26 @@ save_directory = os.path.join(os.getcwd(), 'Collections')
 os.makedirs(save_directory, exist_ok=True)  # Create the directory if it does not exist
 
 for i, devops_server_url in enumerate(urls):
-    pat = pats[i]  # Get the corresponding PAT for the current server URL
+    # Get the corresponding PAT for the current server URL; a list or ';'-separated entry is used as a pool
+    server_pats = list(pats[i]) if isinstance(pats[i], (list, tuple)) else token_pool.split_pats(pats[i])
+    token_pool.register(devops_server_url, server_pats)
+    pat = server_pats[0] if server_pats else pats[i]
     # Extract the collection name from the URL
     collection_name = devops_server_url.split('/')[-1]
     print(f"Processing DevOps Server Collection: {collection_name}")
 
+    if args.quick:
+        # Size, default branch, branch and tag counts and last push of every repository; no branch sheets
+        rows = []
+        for project_name in get_project_names(devops_server_url, pat):
+            print(f"Scanning project: {project_name}")
+            rows.extend(quick_scan.scan_project(devops_server_url, project_name, pat))
+        save_path = os.path.join(save_directory, f'{collection_name}_quick_scan.xlsx')
+        with pd.ExcelWriter(save_path, engine='xlsxwriter') as writer:
+            pd.DataFrame(rows, columns=quick_scan.QUICK_SCAN_COLUMNS).to_excel(writer, sheet_name='quick_scan', index=False)
+        print(f"Quick scan generated successfully: {save_path}")
+        continue
+
     # Create a DataFrame writer object to save multiple sheets
     save_path = os.path.join(save_directory, f'{collection_name}_discovery_report.xlsx')
     with pd.ExcelWriter(save_path, engine='xlsxwriter') as writer:
@@ -39,7 +63,7 @@ for i, devops_server_url in enumerate(urls):
         projects_api_url = f'{devops_server_url}/_apis/projects?api-version=6.0'
         
         # Making the request to the API
-        response = requests.get(projects_api_url, auth=HTTPBasicAuth('', pat))
+        response = http_client.get(projects_api_url, pat)
         
         if response.status_code == 200:
             try:
@@ -52,20 +76,23 @@ for i, devops_server_url in enumerate(urls):
 
                     # Check for Git repositories
                     repos_api_url = f'{devops_server_url}/{project_name}/_apis/git/repositories?api-version=6.0'
-                    repo_response = requests.get(repos_api_url, auth=HTTPBasicAuth('', pat))
+                    repo_response = http_client.get(repos_api_url, pat)
 
                     if repo_response.status_code == 200:
                         try:
                             repos = repo_response.json()['value']
                             if repos:
-                                for repo in repos:
+                                # Check for branches in each Git repository concurrently
+                                branches_responses = async_engine.fan_out(
+                                    devops_server_url,
+                                    lambda repo: http_client.get(f'{devops_server_url}/{project_name}/_apis/git/repositories/{repo["name"]}/refs?api-version=6.0&filter=heads/', pat),
+                                    repos)
+                                for repo, branches_response in zip(repos, branches_responses):
                                     repo_name = repo['name']
 
-                                    # Check for branches in each Git repository
-                                    branches_api_url = f'{devops_server_url}/{project_name}/_apis/git/repositories/{repo_name}/refs?api-version=6.0&filter=heads/'
-                                    branches_response = requests.get(branches_api_url, auth=HTTPBasicAuth('', pat))
-
-                                    if branches_response.status_code == 200:
+                                    if branches_response is None:
+                                        print(f"    Failed to retrieve branches for repository '{repo_name}'.")
+                                    elif branches_response.status_code == 200:
                                         try:
                                             branches = branches_response.json()['value']
                                             if branches:
@@ -84,7 +111,7 @@ for i, devops_server_url in enumerate(urls):
                     
                     # Check for TFVC branches
                     tfvc_check_api_url = f'{devops_server_url}/{project_name}/_apis/tfvc/branches?api-version=6.0'
-                    tfvc_response = requests.get(tfvc_check_api_url, auth=HTTPBasicAuth('', pat))
+                    tfvc_response = http_client.get(tfvc_check_api_url, pat)
 
                     if tfvc_response.status_code == 200:
                         try:
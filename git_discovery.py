@@ -1,18 +1,26 @@
 import os
 import pandas as pd
 import requests
-from requests.auth import HTTPBasicAuth
 from openpyxl import load_workbook
 from openpyxl.styles import PatternFill, Font, Alignment, Border, Side
-from datetime import datetime
+from datetime import datetime, timezone
 import getpass
 import logging
 from urllib.parse import quote
-from requests.adapters import HTTPAdapter
-from urllib3.util.retry import Retry
 from collections import defaultdict
 import gc
-from utils.common import get_project_names, get_repo_names_by_project
+import argparse
+import itertools
+from utils.common import get_project_names, get_repo_names_by_project, apply_concurrency_settings, apply_token_pools
+from utils import http_client, async_engine, rate_limiter, response_cache, metrics, deadlines, git_mirror, blob_sizes, discovery_state, worker_pool, quick_scan
+from utils.pagination import paginate
+from utils.json_stream import iter_json_array
+from utils.path_history import PathHistory
+from utils.commit_store import CommitStore
+from utils.tree_cache import TreeCache
+from utils.path_scope import PathScope, split_patterns
+from utils.folder_rollup import FolderRollup, FOLDER_COLUMNS, DEFAULT_FOLDER_DEPTH
+from utils.token_pool import primary_pat
 
 log_dir = "logs"
 if not os.path.exists(log_dir):
@@ -36,40 +44,49 @@ logger.addHandler(file_handler)
 logger.addHandler(console_handler)
 
 
+# Item fields kept from full-recursion listings; everything else is dropped while parsing
+ITEM_FIELDS = ('path', 'objectId', 'gitObjectType', 'isFolder')
+TREE_ENTRY_FIELDS = ('objectId', 'gitObjectType', 'size')
+TREE_LISTING_FIELDS = ('relativePath',) + TREE_ENTRY_FIELDS
+# Changes requested per page of a commit's change list
+CHANGES_PAGE_SIZE = 1000
+# Changes requested per page of a diff between two commits
+DIFF_PAGE_SIZE = 1000
+# Commit IDs resolved per commitsbatch request
+COMMITS_BATCH_SIZE = 100
+
+# Optional input form columns restricting a repository to some subtrees: repo key -> column
+SCOPE_COLUMNS = {'scope_paths': 'Scope Paths', 'include_globs': 'Include Globs', 'exclude_globs': 'Exclude Globs'}
+
+# Repository listings per (server URL, project) for the current run
+_project_repositories = {}
+
+
 def encode_url_component(component):
     return quote(component, safe='')
 
     
-def make_request_with_retries(url, pat, timeout=300, max_retries=10, backoff_factor=0.5):
-    auth = HTTPBasicAuth('', pat)
-    session = requests.Session()
-    retries = Retry(
-        total=max_retries,
-        backoff_factor=backoff_factor,
-        status_forcelist=[408, 429, 500, 502, 503, 504],
-        allowed_methods=["HEAD", "GET", "OPTIONS"]
-    )
-    session.mount('https://', HTTPAdapter(max_retries=retries))
-    for attempt in range(max_retries):
-        try:
-            response = session.get(url, auth=auth, timeout=timeout)
-            if response.status_code == 200:
-                logger.info(f"Request succeeded for URL {url}")
-                return response
-            elif response.status_code == 404:
-                logger.info(f"Resource not found (404) for URL {url}.")
-                return None
-            elif response.status_code == 403:
-                logger.error("Access forbidden (403). Check permissions or credentials.")
-                return None
-            else:
-                logger.warning(f"Unexpected status code {response.status_code} for URL {url}.")
-                return None
-        except requests.exceptions.RequestException as e:
-            logger.error(f"Error occurred while making request to {url}: {e}")
+def make_request_with_retries(url, pat, timeout=300, stream=False, method='GET', json=None):
+    try:
+        if json is not None:
+            response = http_client.request(method, url, pat, timeout=timeout, json=json)
+        else:
+            response = http_client.request(method, url, pat, timeout=timeout, stream=stream)
+        if response.status_code == 200:
+            logger.info(f"Request succeeded for URL {url}")
+            return response
+        elif response.status_code == 404:
+            logger.info(f"Resource not found (404) for URL {url}.")
             return None
-    logger.error(f"Exceeded max retries for URL {url}")
-    return None
+        elif response.status_code == 403:
+            logger.error("Access forbidden (403). Check permissions or credentials.")
+            return None
+        else:
+            logger.warning(f"Unexpected status code {response.status_code} for URL {url}.")
+            return None
+    except requests.exceptions.RequestException as e:
+        logger.error(f"Error occurred while making request to {url}: {e}")
+        return None
 
 
 # Function to read configuration from Excel file
@@ -107,299 +124,465 @@ def authenticate_and_get_projects(server_url, pat, api_version):
         return None
 
 def get_repositories(server_url, project, pat, api_version, batch_size=50):
-    """Retrieve all repositories with direct token handling, URL updates, and empty response checks."""
+    """Retrieve all repositories, following continuation tokens."""
     encoded_project = encode_url_component(project)
     url = f'{server_url}/{encoded_project}/_apis/git/repositories?$top={batch_size}&api-version={api_version}'
-    
-    all_repositories = []
-    repo_set = set()
+    return list(paginate(lambda page_url: make_request_with_retries(page_url, pat), url, dedup_key='id'))
 
-    while True:
-        response = make_request_with_retries(url, pat)
-        
-        if response:
-            response_data = response.json()
-            if 'value' in response_data and isinstance(response_data['value'], list):
-                data = response_data['value']
-                if not data:
-                    logger.info("No repositories found in the current batch; stopping.")
-                    break
-                for repo in data:
-                    if isinstance(repo, dict):  # Ensure repo is a dictionary
-                        repo_id = repo.get('id')
-                        if repo_id and repo_id not in repo_set:
-                            all_repositories.append(repo)
-                            repo_set.add(repo_id)
-                    else:
-                        logger.error(f"Unexpected format for repository item: {repo}")
-
-                continuation_token = response.headers.get('x-ms-continuationtoken')
-                if continuation_token:
-                    url = f'{server_url}/{encoded_project}/_apis/git/repositories?$top={batch_size}&api-version={api_version}&continuationToken={continuation_token}'
-                else:
-                    break
-            else:
-                logger.error(f"Unexpected response format: {response_data}")
-                break
-        else:
-            logger.error('Failed to retrieve repositories with pagination or no valid data found.')
-            break
 
-    return all_repositories
+def get_project_repositories(server_url, project, pat, api_version, batch_size=50):
+    """Repositories of a project, listed once per run however many of its repositories are processed."""
+    key = (server_url, project)
+    if key not in _project_repositories:
+        _project_repositories[key] = get_repositories(server_url, project, pat, api_version, batch_size)
+    return _project_repositories[key]
 
 
 def get_branches(server_url, project, repository_id, pat, api_version, batch_size=50):
     encoded_project = encode_url_component(project)
     encoded_repository_id = encode_url_component(repository_id)
     url = f'{server_url}/{encoded_project}/_apis/git/repositories/{encoded_repository_id}/refs?filter=heads&$top={batch_size}&api-version={api_version}'
-    
-    all_branches = []
-    branch_set = set()
+    return list(paginate(lambda page_url: make_request_with_retries(page_url, pat), url, dedup_key='name'))
 
-    while True:
-        response = make_request_with_retries(url, pat)
-
-        if response:
-            response_data = response.json()
-            data = response_data.get('value', [])
-            if not data:
-                break
-            for branch in data:
-                branch_name = branch.get('name')
-                if branch_name and branch_name not in branch_set:
-                    all_branches.append(branch)
-                    branch_set.add(branch_name)
-
-            continuation_token = response.headers.get('x-ms-continuationtoken')
-            if continuation_token:
-                url = f'{server_url}/{encoded_project}/_apis/git/repositories/{encoded_repository_id}/refs?filter=heads&$top={batch_size}&api-version={api_version}&continuationToken={continuation_token}'
-            else:
-                break
-        else:
-            break
 
-    return all_branches
 
+def get_branch_stats(server_url, project, repository_id, pat, api_version):
+    """Ahead/behind counts of every branch against the default branch, with each branch's head commit."""
+    encoded_project = encode_url_component(project)
+    encoded_repository_id = encode_url_component(repository_id)
+    url = f'{server_url}/{encoded_project}/_apis/git/repositories/{encoded_repository_id}/stats/branches?api-version={api_version}'
+    return list(paginate(lambda page_url: make_request_with_retries(page_url, pat), url, dedup_key='name'))
 
 
-def get_latest_commit_info(server_url, project, repository_id, branch_names, pat, api_version):
-    """Retrieve latest commit info for each branch in a batch."""
+def get_latest_commit_info(server_url, project, repository_id, branch_names, heads, store, pat, api_version):
+    """Latest commit info of each branch, with head IDs taken from the refs listing (heads: {branch: objectId})
+    and all heads hydrated together through get_commits_by_id.
+    """
+    head_commits = get_commits_by_id(server_url, project, repository_id,
+                                     [heads[branch] for branch in branch_names if branch in heads], store, pat, api_version)
     latest_commits = {}
     for branch_name in branch_names:
-        encoded_branch_name = encode_url_component(branch_name)
-        url = f'{server_url}/{project}/_apis/git/repositories/{repository_id}/commits?searchCriteria.itemVersion.version={encoded_branch_name}&$top=1&api-version={api_version}'
-        response = make_request_with_retries(url, pat)
-        if response:
-            commit = response.json().get('value', [None])[0]
-            if commit:
-                latest_commits[branch_name] = {
-                    'commitId': commit['commitId'],
-                    'comment': commit['comment'],
-                    'author': commit['author']['name'],
-                    'date': commit['author']['date']
-                }
+        commit = head_commits.get(heads.get(branch_name))
+        if commit:
+            latest_commits[branch_name] = {
+                'commitId': commit['commitId'],
+                'comment': commit['comment'],
+                'author': commit['author']['name'],
+                'date': commit['author']['date']
+            }
     return latest_commits
 
 
-def get_files_in_branch(server_url, project, repository_id, branch_name, pat, api_version, batch_size=50):
+def get_files_in_branch(server_url, project, repository_id, branch_name, pat, api_version, batch_size=50, scope_path='/'):
+    """Full-recursion item listing of a branch below scope_path, or None if any page could not be read."""
     encoded_project = encode_url_component(project)
     encoded_repository_id = encode_url_component(repository_id)
     encoded_branch_name = encode_url_component(branch_name)
-    url = f'{server_url}/{encoded_project}/_apis/git/repositories/{encoded_repository_id}/items?scopePath=/&recursionLevel=Full&versionDescriptor[version]={encoded_branch_name}&$top={batch_size}&api-version={api_version}'
-    
-    all_files = []
-    file_set = set()
-
+    url = f'{server_url}/{encoded_project}/_apis/git/repositories/{encoded_repository_id}/items?scopePath={encode_url_component(scope_path)}&recursionLevel=Full&versionDescriptor[version]={encoded_branch_name}&$top={batch_size}&api-version={api_version}'
+    failed = []
+
+    def fetch(page_url):
+        response = make_request_with_retries(page_url, pat, stream=True)
+        if not response:
+            failed.append(page_url)
+        return response
+
+    # Full-recursion listings can be hundreds of MB, so items are decoded and projected as they arrive
+    items = list(paginate(fetch, url, dedup_key='path', stream=True, fields=ITEM_FIELDS))
+    return None if failed else items
+
+def get_tree_entries(server_url, project, repository_id, tree_id, pat, api_version, recursive=False):
+    """Entries of a tree object (every entry below it when recursive), or None if it could not be read."""
+    url = f'{server_url}/{project}/_apis/git/repositories/{repository_id}/trees/{tree_id}?recursive={str(recursive).lower()}&api-version={api_version}'
+    # Recursive listings are streamed; single trees are small, read whole and served from the response cache
+    response = make_request_with_retries(url, pat, stream=recursive)
+    if not response:
+        return None
+    if recursive:
+        entries = list(iter_json_array(response, key='treeEntries', fields=TREE_LISTING_FIELDS))
+    else:
+        entries = [{field: entry[field] for field in TREE_LISTING_FIELDS if field in entry}
+                   for entry in response.json().get('treeEntries', [])]
+    blob_sizes.get_index().put_many({entry['objectId']: entry['size'] for entry in entries
+                                     if entry.get('gitObjectType') == 'blob' and 'size' in entry})
+    return entries
+
+
+def get_subtree_items(server_url, project, repository_id, tree_id, path, trees, recursive, pat, api_version):
+    """Items at and below path in the tree tree_id, rebuilt from the TreeCache; [] if path is not a folder
+    and None if a tree could not be read. Uncached trees below path are read with one recursive listing
+    when recursive, otherwise one level at a time.
+    """
+    def fetch(tree_ids):
+        listings = async_engine.fan_out(
+            server_url, lambda subtree_id: get_tree_entries(server_url, project, repository_id, subtree_id, pat, api_version),
+            tree_ids)
+        if any(listing is None for listing in listings):
+            return False
+        for subtree_id, listing in zip(tree_ids, listings):
+            trees.add(subtree_id, listing)
+        return True
+
+    # Only the trees on the way down to path are listed
     while True:
-        response = make_request_with_retries(url, pat)
-
-        if response:
-            response_data = response.json()
-            data = response_data.get('value', [])
-            if not data:
-                break
-            for file_data in data:
-                file_path = file_data.get('path')
-                if file_path and file_path not in file_set:
-                    all_files.append(file_data)
-                    file_set.add(file_path)
-
-            continuation_token = response.headers.get('x-ms-continuationtoken')
-            if continuation_token:
-                url = f'{server_url}/{encoded_project}/_apis/git/repositories/{encoded_repository_id}/items?scopePath=/&recursionLevel=Full&versionDescriptor[version]={encoded_branch_name}&$top={batch_size}&api-version={api_version}&continuationToken={continuation_token}'
-            else:
+        try:
+            subtree_id = trees.resolve(tree_id, path)
+            break
+        except KeyError as e:
+            if not fetch([e.args[0]]):
+                return None
+    if subtree_id is None:
+        logger.warning(f"Scope path '{path}' is not a folder of tree {tree_id}")
+        return []
+    if recursive and subtree_id not in trees:
+        entries = get_tree_entries(server_url, project, repository_id, subtree_id, pat, api_version, recursive=True)
+        if entries is not None:
+            trees.add_recursive(subtree_id, entries)
+    missing = trees.missing(subtree_id)
+    while missing:
+        if not fetch(missing):
+            return None
+        missing = trees.missing(subtree_id)
+    return trees.items(subtree_id, path)
+
+
+def get_branch_items(server_url, project, repository_id, branch, head, trees, pat, api_version, batch_size=50, scope=None):
+    """Items of a branch within scope (a PathScope; the whole tree by default) rebuilt from the repository's
+    TreeCache, fetching only trees no other branch had.
+
+    The first branch of a repository reads each scope path with one recursive tree listing; later branches
+    fetch the subtrees whose IDs differ, one level at a time. Tree listings also fill the blob size index.
+    Falls back to full-recursion item listings of the scope paths if a tree cannot be read, and returns None
+    if those cannot be read in full either.
+    """
+    scope = scope or PathScope()
+    details = get_commit_details(server_url, project, repository_id, head, pat, api_version)
+    tree_id = details.get('treeId') if details else None
+    if tree_id:
+        # Nothing to share with yet: one recursive listing per scope path beats walking level by level
+        recursive = not trees
+        items = []
+        for path in scope.paths:
+            subtree_items = get_subtree_items(server_url, project, repository_id, tree_id, path, trees, recursive, pat, api_version)
+            if subtree_items is None:
                 break
+            items.extend(subtree_items)
         else:
-            break
-
-    return all_files
-
-def get_file_size(server_url, project, repository_id, sha1_list, pat, api_version):
-    """Retrieve file sizes in batch using SHA1 list."""
-    file_sizes = {}
-    for sha1 in sha1_list:
+            logger.info(f"Items of branch '{branch}' rebuilt from cached trees ({len(trees)} trees cached)")
+            return scope.filter_items(items)
+    logger.info(f"Trees of branch '{branch}' unavailable; listing its items in full")
+    items = []
+    for path in scope.paths:
+        path_items = get_files_in_branch(server_url, project, repository_id, branch, pat, api_version, batch_size=batch_size, scope_path=path)
+        if path_items is None:
+            logger.warning(f"Items of branch '{branch}' below '{path}' could not be listed in full")
+            return None
+        items.extend(path_items)
+    return scope.filter_items(items)
+
+
+def get_tree_blob_sizes(server_url, project, repository_id, tree_id, pat, api_version):
+    """Sizes of every blob below a tree, from a single recursive trees listing."""
+    url = f'{server_url}/{project}/_apis/git/repositories/{repository_id}/trees/{tree_id}?recursive=true&api-version={api_version}'
+    response = make_request_with_retries(url, pat, stream=True)
+    if not response:
+        return {}
+    entries = iter_json_array(response, key='treeEntries', fields=TREE_ENTRY_FIELDS)
+    return {entry['objectId']: entry['size'] for entry in entries if entry.get('gitObjectType') == 'blob' and 'size' in entry}
+
+
+def get_file_size(server_url, project, repository_id, sha1_list, pat, api_version, tree_id=None):
+    """Retrieve file sizes for a SHA1 list without transferring any blob content.
+
+    Sizes come from the persistent SHA1 index first, then from one recursive listing of the branch's root tree,
+    and only blobs still unknown are sized concurrently with HEAD requests.
+    """
+    index = blob_sizes.get_index()
+    sizes = index.get_many(sha1_list)
+    missing = [sha1 for sha1 in dict.fromkeys(sha1_list) if sha1 not in sizes]
+    if missing and tree_id:
+        tree_sizes = get_tree_blob_sizes(server_url, project, repository_id, tree_id, pat, api_version)
+        index.put_many(tree_sizes)
+        sizes.update((sha1, tree_sizes[sha1]) for sha1 in missing if sha1 in tree_sizes)
+        missing = [sha1 for sha1 in missing if sha1 not in sizes]
+
+    def fetch_size(sha1):
         url = f'{server_url}/{project}/_apis/git/repositories/{repository_id}/blobs/{sha1}?api-version={api_version}'
+        response = make_request_with_retries(url, pat, method='HEAD')
+        if response is None or 'Content-Length' not in response.headers:
+            # Front ends that do not answer HEAD: read the headers of a streamed GET and drop the body unread
+            response = make_request_with_retries(url, pat, stream=True)
+            if response is None:
+                return None
+            response.close()
+        length = response.headers.get('Content-Length')
+        return int(length) if length is not None else None
+
+    if missing:
+        logger.info(f"Sizing {len(missing)} blobs not found in the index or tree listing")
+        fetched = async_engine.fan_out(server_url, fetch_size, missing)
+        fetched = {sha1: size for sha1, size in zip(missing, fetched) if size is not None}
+        index.put_many(fetched)
+        sizes.update(fetched)
+    return sizes
+
+
+def get_commit_changes(server_url, project, repository_id, commit_id, pat, api_version, batch_size=CHANGES_PAGE_SIZE):
+    """Paths changed by a commit, following the skip pagination of its change list; None if any page could not be read."""
+    url = f'{server_url}/{project}/_apis/git/repositories/{repository_id}/commits/{commit_id}/changes?top={batch_size}&api-version={api_version}'
+    failed = []
+
+    def fetch(page_url):
+        response = make_request_with_retries(page_url, pat)
+        if not response:
+            failed.append(page_url)
+        return response
+
+    changes = paginate(fetch, url, page_size=batch_size, use_skip=True, skip_param='skip', prefetch=False, key='changes',
+                       dedup_key=lambda change: change.get('item', {}).get('path'))
+    paths = [change['item']['path'] for change in changes]
+    return None if failed else paths
+
+
+def get_path_history(server_url, project, repository_id, commits, pat, api_version, scope=None, changes=None):
+    """Commit count and last change per path, from the change lists of a branch's commits (newest first),
+    or None if any change list could not be read.
+
+    With scope, changes outside it are ignored. changes ({commit ID: paths}) holds the change lists already
+    read for the repository's other branches; the ones read here are added to it.
+    """
+    changes = {} if changes is None else changes
+    missing = [commit['commitId'] for commit in commits if commit['commitId'] not in changes]
+    change_lists = async_engine.fan_out(
+        server_url, lambda commit_id: get_commit_changes(server_url, project, repository_id, commit_id, pat, api_version),
+        missing)
+    changes.update((commit_id, paths) for commit_id, paths in zip(missing, change_lists) if paths is not None)
+    failed = sum(paths is None for paths in change_lists)
+    if failed:
+        logger.warning(f"Change lists of {failed} of {len(commits)} commits could not be read")
+        return None
+    history = PathHistory()
+    for commit in commits:
+        paths = changes[commit['commitId']]
+        history.add_commit(commit, scope.filter_paths(paths) if scope else paths)
+    return history
+
+
+def get_scope_commit_ids(server_url, project, repository_id, branch, scope, pat, api_version, batch_size=50):
+    """IDs of the branch's commits that changed something below one of the scope paths, or None when the
+    scope covers the whole tree (globs only), as every commit's change list is then filtered instead.
+    """
+    if scope.paths == ['/']:
+        return None
+    commit_ids = set()
+    for path in scope.paths:
+        commit_ids.update(commit['commitId'] for commit in get_all_commits(
+            server_url, project, repository_id, branch, pat, api_version, batch_size=batch_size, item_path=path))
+    return commit_ids
+
+def get_tree_diff(server_url, project, repository_id, base_commit, target_commit, pat, api_version, batch_size=DIFF_PAGE_SIZE):
+    """Item changes between two commits, or None if any page of the diff could not be read."""
+    changes = []
+    seen = set()
+    skip = 0
+    while True:
+        url = (f'{server_url}/{project}/_apis/git/repositories/{repository_id}/diffs/commits?baseVersion={base_commit}&baseVersionType=commit'
+               f'&targetVersion={target_commit}&targetVersionType=commit&$top={batch_size}&$skip={skip}&api-version={api_version}')
         response = make_request_with_retries(url, pat)
-        if response:
-            file_sizes[sha1] = int(response.headers.get('Content-Length', 0))
-    return file_sizes
-
-
-def get_commit_count(server_url, project, repository_id, file_paths, pat, api_version):
-    """Retrieve commit counts for each file in batch using file paths."""
-    commit_counts = {}
-    for file_path in file_paths:
-        url = f'{server_url}/{project}/_apis/git/repositories/{repository_id}/commits?searchCriteria.itemPath={file_path}&api-version={api_version}'
-        response = make_request_with_retries(url, pat)
-        if response:
-            commit_counts[file_path] = response.json().get('count', 1)
-    return commit_counts
-
-def get_all_commits(server_url, project, repository_id, branch_name, pat, api_version, batch_size=50):
-    """Retrieve all commits in a branch with direct token handling, URL updates, and empty response checks."""
+        if not response:
+            return None
+        page = [change for change in response.json().get('changes', []) if change.get('item', {}).get('path') not in seen]
+        changes.extend(page)
+        seen.update(change['item']['path'] for change in page if 'item' in change)
+        if len(page) < batch_size:
+            return changes
+        skip += len(page)
+
+
+def apply_tree_diff(files, changes, tree_id):
+    """A branch's item listing brought forward from files (its previous listing) by the changes since then."""
+    items = {file['path']: file for file in files}
+    for change in changes:
+        item = change.get('item', {})
+        path = item.get('path')
+        change_type = change.get('changeType', '')
+        if not path:
+            continue
+        if 'rename' in change_type and change.get('sourceServerItem'):
+            items.pop(change['sourceServerItem'], None)
+        if 'delete' in change_type:
+            prefix = path.rstrip('/') + '/'
+            for removed in [item_path for item_path in items if item_path == path or item_path.startswith(prefix)]:
+                del items[removed]
+        else:
+            items[path] = {'path': path, 'objectId': item.get('objectId'), 'gitObjectType': item.get('gitObjectType'),
+                           'isFolder': item.get('isFolder', item.get('gitObjectType') == 'tree')}
+    if '/' in items and tree_id:
+        items['/'] = dict(items['/'], objectId=tree_id)
+    # Parents before children, siblings by name, like the full-recursion listing
+    return sorted(items.values(), key=lambda file: file['path'].rstrip('/').split('/'))
+
+
+def get_branch_items_and_history(server_url, project, repository_id, branch, head, commits, previous, trees, pat, api_version, batch_size=50, scope=None, scoped_ids=None, commit_changes=None):
+    """(items, PathHistory, whether the items were brought forward by a diff) of a branch whose head moved
+    since previous (its saved state, or None).
+
+    When the stored head is an ancestor of the new one, only the new commits' change lists and the tree diff
+    since the stored head are fetched and merged into the previous data; otherwise the branch is listed in full.
+    With a scope, only the commits in scoped_ids have their change lists read. commit_changes is the
+    repository's {commit ID: paths} of change lists already read (see get_path_history).
+    Items or history may be None if they could not be read in full.
+    """
+    commit_map = {commit['commitId']: commit for commit in commits}
+    if previous and previous['head'] in commit_map:
+        changes = get_tree_diff(server_url, project, repository_id, previous['head'], head, pat, api_version)
+        head_details = get_commit_details(server_url, project, repository_id, head, pat, api_version)
+        if changes is not None and head_details:
+            # Commits reachable from the new head but not from the stored one, newest first
+            reachable = {previous['head']}
+            stack = [previous['head']]
+            while stack:
+                for parent in commit_map.get(stack.pop(), {}).get('parents', []):
+                    if parent not in reachable:
+                        reachable.add(parent)
+                        stack.append(parent)
+            new_commits = [commit for commit in commits if commit['commitId'] not in reachable]
+            history_commits = new_commits if scoped_ids is None else [commit for commit in new_commits if commit['commitId'] in scoped_ids]
+            new_history = get_path_history(server_url, project, repository_id, history_commits, pat, api_version, scope=scope, changes=commit_changes)
+            history = None
+            if new_history is not None:
+                history = PathHistory(previous['history'])
+                history.merge_newer(new_history)
+            files = apply_tree_diff(previous['files'], changes, head_details.get('treeId'))
+            if scope:
+                files = scope.filter_items(files)
+            logger.info(f"Branch '{branch}' advanced by {len(new_commits)} commits since run {previous['run_id']}; "
+                        f"applied {len(changes)} item changes")
+            return files, history, True
+        logger.info(f"Diff of branch '{branch}' since run {previous['run_id']} unavailable; listing it in full")
+
+    # One pass over the branch's change lists gives every path's commit count and last change
+    history_commits = commits if scoped_ids is None else [commit for commit in commits if commit['commitId'] in scoped_ids]
+    history = get_path_history(server_url, project, repository_id, history_commits, pat, api_version, scope=scope, changes=commit_changes)
+    files = get_branch_items(server_url, project, repository_id, branch, head, trees, pat, api_version, batch_size=batch_size, scope=scope)
+    return files, history, False
+
+
+def date_criteria(from_date=None, to_date=None):
+    """searchCriteria query parameters limiting a commit or push listing to a time window."""
+    criteria = ''
+    if from_date:
+        criteria += f'&searchCriteria.fromDate={encode_url_component(from_date)}'
+    if to_date:
+        criteria += f'&searchCriteria.toDate={encode_url_component(to_date)}'
+    return criteria
+
+
+def get_all_commits(server_url, project, repository_id, branch_name, pat, api_version, batch_size=50, from_date=None, to_date=None, item_path=None):
+    """Yield all commits in a branch (only those dated within from_date..to_date, and those changing
+    item_path, when given), fetching the next page while the current one is consumed.
+    """
     encoded_project = encode_url_component(project)
     encoded_repository_id = encode_url_component(repository_id)
     encoded_branch_name = encode_url_component(branch_name)
-    
-    url = f'{server_url}/{encoded_project}/_apis/git/repositories/{encoded_repository_id}/commits?searchCriteria.itemVersion.version={encoded_branch_name}&$top={batch_size}&api-version={api_version}'
-    all_commits = []
-    commit_set = set()
-
-    while True:
-        response = make_request_with_retries(url, pat)
-        
-        if response:
-            response_data = response.json()
-            # Ensure 'value' key exists and is a list
-            if 'value' in response_data and isinstance(response_data['value'], list):
-                data = response_data['value']
-                if not data:
-                    logger.info("No commits found in the current batch; stopping.")
-                    break
-                for commit in data:
-                    # Check if each commit is a dictionary before accessing 'commitId'
-                    if isinstance(commit, dict):
-                        commit_id = commit.get('commitId')
-                        if commit_id and commit_id not in commit_set:
-                            all_commits.append(commit)
-                            commit_set.add(commit_id)
-                    else:
-                        logger.error(f"Unexpected format for commit item: {commit}")
-
-                continuation_token = response.headers.get('x-ms-continuationtoken')
-                if continuation_token:
-                    url = f'{server_url}/{encoded_project}/_apis/git/repositories/{encoded_repository_id}/commits?searchCriteria.itemVersion.version={encoded_branch_name}&$top={batch_size}&api-version={api_version}&continuationToken={continuation_token}'
-                else:
-                    break
-            else:
-                logger.error(f"Unexpected response format: {response_data}")
-                break
-        else:
-            logger.error('Failed to retrieve commits with pagination or no valid data found.')
-            break
+    path_criteria = f'&searchCriteria.itemPath={encode_url_component(item_path)}' if item_path and item_path != '/' else ''
+    url = f'{server_url}/{encoded_project}/_apis/git/repositories/{encoded_repository_id}/commits?searchCriteria.itemVersion.version={encoded_branch_name}&searchCriteria.$top={batch_size}{date_criteria(from_date, to_date)}{path_criteria}&api-version={api_version}'
+    return paginate(lambda page_url: make_request_with_retries(page_url, pat), url, page_size=batch_size,
+                    use_skip=True, skip_param='searchCriteria.$skip', dedup_key='commitId')
 
-    return all_commits
 
-
-
-def get_all_repo_commits(server_url, project, repository_id, pat, api_version, batch_size=50):
-    """Retrieve all commits in a repository with direct token handling, URL updates, and empty response checks."""
+def get_all_repo_commits(server_url, project, repository_id, pat, api_version, batch_size=50, from_date=None, to_date=None):
+    """Yield all commits in a repository (only those dated within from_date..to_date when given),
+    fetching the next page while the current one is consumed.
+    """
     encoded_project = encode_url_component(project)
     encoded_repository_id = encode_url_component(repository_id)
-    
-    url = f'{server_url}/{encoded_project}/_apis/git/repositories/{encoded_repository_id}/commits?$top={batch_size}&api-version={api_version}'
-    all_commits = []
-    commit_set = set()
+    url = f'{server_url}/{encoded_project}/_apis/git/repositories/{encoded_repository_id}/commits?searchCriteria.$top={batch_size}{date_criteria(from_date, to_date)}&api-version={api_version}'
+    return paginate(lambda page_url: make_request_with_retries(page_url, pat), url, page_size=batch_size,
+                    use_skip=True, skip_param='searchCriteria.$skip', dedup_key='commitId')
 
-    while True:
-        response = make_request_with_retries(url, pat)
-        
-        if response:
-            response_data = response.json()
-            # Ensure 'value' key exists and is a list
-            if 'value' in response_data and isinstance(response_data['value'], list):
-                data = response_data['value']
-                if not data:
-                    logger.info("No repository commits found in the current batch; stopping.")
-                    break
-                for commit in data:
-                    # Check if each commit is a dictionary before accessing 'commitId'
-                    if isinstance(commit, dict):
-                        commit_id = commit.get('commitId')
-                        if commit_id and commit_id not in commit_set:
-                            all_commits.append(commit)
-                            commit_set.add(commit_id)
-                    else:
-                        logger.error(f"Unexpected format for commit item: {commit}")
-
-                continuation_token = response.headers.get('x-ms-continuationtoken')
-                if continuation_token:
-                    url = f'{server_url}/{encoded_project}/_apis/git/repositories/{encoded_repository_id}/commits?$top={batch_size}&api-version={api_version}&continuationToken={continuation_token}'
-                else:
-                    break
-            else:
-                logger.error(f"Unexpected response format: {response_data}")
-                break
-        else:
-            logger.error('Failed to retrieve repository commits with pagination or no valid data found.')
-            break
+def get_pushes(server_url, project, repository_id, pat, api_version, batch_size=50, from_date=None, to_date=None):
+    """Yield the pushes to a repository within from_date..to_date, newest first, with their ref updates."""
+    encoded_project = encode_url_component(project)
+    encoded_repository_id = encode_url_component(repository_id)
+    url = f'{server_url}/{encoded_project}/_apis/git/repositories/{encoded_repository_id}/pushes?searchCriteria.includeRefUpdates=true&$top={batch_size}{date_criteria(from_date, to_date)}&api-version={api_version}'
+    return paginate(lambda page_url: make_request_with_retries(page_url, pat), url, page_size=batch_size,
+                    use_skip=True, skip_param='$skip', dedup_key='pushId')
 
-    return all_commits
 
 def get_tags(server_url, project, repository_id, pat, api_version, batch_size=50):
-    """Retrieve all tags in a repository with direct token handling, URL updates, and empty response checks."""
+    """Retrieve all tags in a repository, following continuation tokens.
+
+    Annotated tags carry the commit they point to as peeledObjectId; lightweight tags point at it directly.
+    """
     encoded_project = encode_url_component(project)
     encoded_repository_id = encode_url_component(repository_id)
-    
-    url = f'{server_url}/{encoded_project}/_apis/git/repositories/{encoded_repository_id}/refs?filter=tags&$top={batch_size}&api-version={api_version}'
-    all_tags = []
-    tag_set = set()
+    url = f'{server_url}/{encoded_project}/_apis/git/repositories/{encoded_repository_id}/refs?filter=tags&peelTags=true&$top={batch_size}&api-version={api_version}'
+    return list(paginate(lambda page_url: make_request_with_retries(page_url, pat), url, dedup_key='name'))
 
-    while True:
-        response = make_request_with_retries(url, pat)
-        
-        if response:
-            response_data = response.json()
-            # Ensure 'value' key exists and is a list
-            if 'value' in response_data and isinstance(response_data['value'], list):
-                data = response_data['value']
-                if not data:
-                    logger.info("No tags found in the current batch; stopping.")
-                    break
-                for tag in data:
-                    # Check if each tag is a dictionary before accessing 'name'
-                    if isinstance(tag, dict):
-                        tag_name = tag.get('name')
-                        if tag_name and tag_name not in tag_set:
-                            all_tags.append(tag)
-                            tag_set.add(tag_name)
-                    else:
-                        logger.error(f"Unexpected format for tag item: {tag}")
-
-                continuation_token = response.headers.get('x-ms-continuationtoken')
-                if continuation_token:
-                    url = f'{server_url}/{encoded_project}/_apis/git/repositories/{encoded_repository_id}/refs?filter=tags&$top={batch_size}&api-version={api_version}&continuationToken={continuation_token}'
-                else:
-                    break
-            else:
-                logger.error(f"Unexpected response format: {response_data}")
-                break
-        else:
-            logger.error('Failed to retrieve tags with pagination or no valid data found.')
-            break
 
-    return all_tags
+def compact_tag(tag):
+    """The annotated-tag fields the report uses."""
+    return {
+        'message': tag['message'],
+        'taggedObject': {'objectId': tag['taggedObject']['objectId']},
+        'taggedBy': {'name': tag['taggedBy']['name'], 'date': tag['taggedBy']['date']}
+    }
 
 
 def get_tag_details(server_url, project, repository_id, tag_ids, pat, api_version):
-    """Retrieve details for each tag in batch using tag IDs."""
-    tag_details = {}
-    for tag_id in tag_ids:
+    """Annotated-tag objects by ID: those recorded by earlier runs are reused and the rest are fetched concurrently."""
+    state = discovery_state.get_state()
+    details = state.get_objects(tag_ids) if state else {}
+    missing = [tag_id for tag_id in dict.fromkeys(tag_ids) if tag_id not in details]
+
+    def fetch_tag(tag_id):
         url = f'{server_url}/{project}/_apis/git/repositories/{repository_id}/annotatedtags/{tag_id}?api-version=6.0-preview.1'
         response = make_request_with_retries(url, pat)
-        if response:
-            tag_details[tag_id] = response.json()
-    return tag_details
+        return compact_tag(response.json()) if response else None
+
+    fetched = async_engine.fan_out(server_url, fetch_tag, missing)
+    fetched = {tag_id: detail for tag_id, detail in zip(missing, fetched) if detail}
+    if state:
+        state.put_objects(fetched)
+    details.update(fetched)
+    return details
+
+
+def get_commits_by_id(server_url, project, repository_id, commit_ids, store, pat, api_version, batch_size=COMMITS_BATCH_SIZE):
+    """{commit ID: commit} from the repository's commit store and the objects recorded by earlier runs,
+    fetching the remaining commits batch_size at a time with commitsbatch.
+    """
+    commit_ids = list(dict.fromkeys(commit_ids))
+    commits = {commit_id: store.get(commit_id) for commit_id in commit_ids if commit_id in store}
+    state = discovery_state.get_state()
+    if state:
+        commits.update(state.get_objects([commit_id for commit_id in commit_ids if commit_id not in commits]))
+    missing = [commit_id for commit_id in commit_ids if commit_id not in commits]
+    url = f'{server_url}/{project}/_apis/git/repositories/{repository_id}/commitsbatch?$top={batch_size}&api-version={api_version}'
+
+    def fetch_batch(batch):
+        response = make_request_with_retries(url, pat, method='POST', json={'ids': batch})
+        return response.json().get('value', []) if response else []
+
+    batches = [missing[start:start + batch_size] for start in range(0, len(missing), batch_size)]
+    fetched = {}
+    for page in async_engine.fan_out(server_url, fetch_batch, batches):
+        for commit in page or []:
+            fetched[commit['commitId']] = commit
+    # Batch listings truncate long messages; those commits are read in full by ID
+    truncated = [commit_id for commit_id, commit in fetched.items() if commit.get('commentTruncated')]
+    details = async_engine.fan_out(
+        server_url, lambda commit_id: get_commit_details(server_url, project, repository_id, commit_id, pat, api_version),
+        truncated)
+    fetched.update((commit_id, detail) for commit_id, detail in zip(truncated, details) if detail)
+    fetched = {commit_id: {'commitId': commit_id, 'comment': commit['comment'],
+                           'author': {'name': commit['author']['name'], 'date': commit['author']['date']}}
+               for commit_id, commit in fetched.items()}
+    if state:
+        state.put_objects(fetched)
+    commits.update(fetched)
+    return commits
 
 
 
@@ -417,10 +600,60 @@ def get_commit_details(server_url, project, repository_id, commit_id, pat, api_v
     return None
 
 
+def compact_commit(commit):
+    """The commit fields the report uses, so each commit held in the store stays small."""
+    return {
+        'commitId': commit['commitId'],
+        'comment': commit['comment'],
+        'author': {'name': commit['author']['name'], 'date': commit['author']['date']},
+        'parents': commit.get('parents', [])
+    }
+
+
+def collect_branch_commits(server_url, project, repository_id, branch_name, head_id, store, pat, api_version, batch_size=50):
+    """Commits of a branch, newest first, fetching only those not already in the repository's commit store.
+
+    The branch listing is paged newest first and abandoned as soon as every commit reachable from the head
+    is in the store. Listings do not carry parent IDs, so each newly seen commit is fetched once by ID
+    (immutable, so cached across runs) to link it into the store.
+
+    If a commit cannot be fetched, the store cannot link the history below it, so the branch's commits are
+    taken from the whole listing instead; the head then stays incomplete in the store and is not recorded.
+    """
+    frontier = store.frontier(head_id)
+    if frontier:
+        listed = []
+        listing = get_all_commits(server_url, project, repository_id, branch_name, pat, api_version, batch_size=batch_size)
+        try:
+            while frontier:
+                page = list(itertools.islice(listing, batch_size))
+                if not page:
+                    logger.warning(f"Listing of branch '{branch_name}' ended before its history was complete")
+                    break
+                listed.extend(page)
+                new_ids = [commit['commitId'] for commit in page if commit['commitId'] not in store and 'parents' not in commit]
+                details = async_engine.fan_out(
+                    server_url, lambda commit_id: get_commit_details(server_url, project, repository_id, commit_id, pat, api_version),
+                    new_ids)
+                details = {commit_id: detail for commit_id, detail in zip(new_ids, details) if detail}
+                if len(details) < len(new_ids):
+                    logger.warning(f"{len(new_ids) - len(details)} commits of branch '{branch_name}' could not be fetched; "
+                                   f"taking its commits from the full listing")
+                    listed.extend(listing)
+                    return [compact_commit(commit) for commit in listed]
+                for commit in page:
+                    if commit['commitId'] not in store:
+                        store.add(compact_commit(commit if 'parents' in commit else details[commit['commitId']]))
+                frontier.advance()
+        finally:
+            listing.close()
+    return store.walk(head_id)
+
+
 def map_commit_tags(tags):
     commit_tag_map = {}
     for tag in tags:
-        commit_id = tag['peeledObjectId'] if 'peeledObjectId' in tag else tag['objectId']
+        commit_id = tag.get('peeledObjectId') or tag['objectId']
         commit_tag_map[commit_id] = tag['name']
     return commit_tag_map
 
@@ -480,7 +713,7 @@ def sanitize_sheet_name(name):
     return name[:31]  # Excel sheet names can have a maximum of 31 characters
 
 
-def generate_report(data_source_code, data_commits, data_all_commits, data_tags, output_path, project_name, repo_name,server_url, start_time):
+def generate_report(data_source_code, data_commits, data_all_commits, data_tags, output_path, project_name, repo_name,server_url, start_time, data_branch_stats=(), data_folders=()):
     
     with pd.ExcelWriter(output_path, engine='openpyxl') as writer:
         # Create an empty summary sheet
@@ -489,9 +722,16 @@ def generate_report(data_source_code, data_commits, data_all_commits, data_tags,
         df_commits = pd.DataFrame(data_commits)
         df_all_commits = pd.DataFrame(data_all_commits)
         df_tags = pd.DataFrame(data_tags)
+        df_performance = pd.DataFrame(metrics.snapshot(), columns=metrics.PERFORMANCE_COLUMNS)
         df_source_code.to_excel(writer, sheet_name='source_code', index=False)
         df_commits.to_excel(writer, sheet_name='commits', index=False)
         df_tags.to_excel(writer, sheet_name='tags', index=False)
+        pd.DataFrame(list(data_branch_stats), columns=BRANCH_STATS_COLUMNS).to_excel(writer, sheet_name='branch_stats', index=False)
+        pd.DataFrame(list(data_folders), columns=FOLDER_COLUMNS).to_excel(writer, sheet_name='folders', index=False)
+        df_performance.to_excel(writer, sheet_name='Performance', index=False)
+        # Requests per PAT, identified by fingerprint only
+        pd.DataFrame(metrics.identity_snapshot(), columns=metrics.IDENTITY_COLUMNS).to_excel(
+            writer, sheet_name='PAT Usage', index=False)
     
     workbook = load_workbook(output_path)
     worksheet_summary = workbook['summary']
@@ -510,7 +750,7 @@ def generate_report(data_source_code, data_commits, data_all_commits, data_tags,
     remove_gridlines(workbook['tags'])
 
     # Make header text bold for all sheets except the summary sheet
-    for sheet_name in ['source_code', 'commits', 'tags']:
+    for sheet_name in ['source_code', 'commits', 'tags', 'branch_stats', 'folders', 'Performance', 'PAT Usage']:
         sheet = workbook[sheet_name]
         apply_header_styles(workbook, sheet_name)
         apply_black_border(sheet)
@@ -559,17 +799,151 @@ def generate_report(data_source_code, data_commits, data_all_commits, data_tags,
     apply_black_border(worksheet_summary)  # Apply black border to summary sheet
 
     workbook.save(output_path)
+    metrics.write_json(metrics.sidecar_path(output_path))
+
+def generate_delta_report(data_commits, data_ref_moves, output_path, since, until):
+    """Workbook of the commits and ref moves of one repository within a time window."""
+    with pd.ExcelWriter(output_path, engine='openpyxl') as writer:
+        pd.DataFrame([{'Since': since or '', 'Until': until or '', 'Commits': len(data_commits),
+                       'Ref Moves': len(data_ref_moves)}]).to_excel(writer, sheet_name='window', index=False)
+        pd.DataFrame(data_commits).to_excel(writer, sheet_name='delta_commits', index=False)
+        pd.DataFrame(data_ref_moves).to_excel(writer, sheet_name='ref_moves', index=False)
+        pd.DataFrame(metrics.snapshot(), columns=metrics.PERFORMANCE_COLUMNS).to_excel(writer, sheet_name='Performance', index=False)
+
+    workbook = load_workbook(output_path)
+    for sheet_name in ['window', 'delta_commits', 'ref_moves', 'Performance']:
+        sheet = workbook[sheet_name]
+        apply_header_styles(workbook, sheet_name)
+        apply_black_border(sheet)
+        remove_gridlines(sheet)
+        adjust_column_width(sheet)
+        align_cells(sheet)
+    workbook.save(output_path)
+    metrics.write_json(metrics.sidecar_path(output_path))
+
+def commit_row(server_url, project, repository_name, branch, commit):
+    return {
+        'Collection Name': server_url.split('/')[-1],
+        'Project Name': project,
+        'Repository Name': repository_name,
+        'Branch Name': branch,
+        'Commit ID': commit['commitId'],
+        'Commit Message': commit['comment'],
+        'Author': commit['author']['name'],
+        'Commit Date': commit['author']['date']
+    }
+
+
+def source_code_row(server_url, project, repository_name, branch, file_path, is_folder, size, commit_info, last_change):
+    """last_change is the path's entry in the branch's PathHistory; without one, the branch head is shown."""
+    change = last_change or commit_info
+    return {
+        'Collection Name': server_url.split('/')[-1],
+        'Project Name': project,
+        'Repository Name': repository_name,
+        'Branch Name': branch,
+        'File Name': file_path.split('/')[-1],
+        'File Type': 'Folder' if is_folder else 'File',
+        'Folder Level': file_path.count('/') - 1,
+        'Path': file_path,
+        'Size (Bytes)': int(size),
+        'Last Modified Time': change['date'],
+        'Author': change['author'],
+        'Comments': change['comment'],
+        'Commit ID': change['commitId'],
+        'Commit Count': last_change['count'] if last_change else 0
+    }
+
+
+BRANCH_STATS_COLUMNS = ['Collection Name', 'Project Name', 'Repository Name', 'Branch Name', 'Default Branch',
+                        'Ahead', 'Behind', 'Head Commit ID', 'Author', 'Last Updated']
+
+
+def branch_stats_row(server_url, project, repository_name, stat):
+    """stat is an entry of the stats/branches listing; counts are relative to the default branch."""
+    commit = stat.get('commit') or {}
+    author = commit.get('author') or {}
+    return {
+        'Collection Name': server_url.split('/')[-1],
+        'Project Name': project,
+        'Repository Name': repository_name,
+        'Branch Name': stat['name'],
+        'Default Branch': 'Yes' if stat.get('isBaseVersion') else 'No',
+        'Ahead': stat.get('aheadCount', 0),
+        'Behind': stat.get('behindCount', 0),
+        'Head Commit ID': commit.get('commitId'),
+        'Author': author.get('name'),
+        'Last Updated': (commit.get('committer') or author).get('date')
+    }
+
+
+# Object ID of a ref that was created or deleted by a push
+ZERO_OBJECT_ID = '0' * 40
+
+
+def ref_move_row(server_url, project, repository_name, push, ref_update):
+    if ref_update['oldObjectId'] == ZERO_OBJECT_ID:
+        change = 'created'
+    elif ref_update['newObjectId'] == ZERO_OBJECT_ID:
+        change = 'deleted'
+    else:
+        change = 'updated'
+    return {
+        'Collection Name': server_url.split('/')[-1],
+        'Project Name': project,
+        'Repository Name': repository_name,
+        'Ref Name': ref_update['name'],
+        'Change': change,
+        'Old Object ID': ref_update['oldObjectId'],
+        'New Object ID': ref_update['newObjectId'],
+        'Pushed By': (push.get('pushedBy') or {}).get('displayName'),
+        'Push Date': push['date'],
+        'Push ID': push['pushId']
+    }
+
+
+def all_commit_row(commit):
+    return {
+        'Author': commit['author']['name'],
+        'Commit Message': commit['comment'],
+        'Commit ID': commit['commitId'],
+        'Commit Date': commit['author']['date'],
+        'Tag Name': 'not tagged'  # Placeholder, will update if tags found
+    }
+
 
-def process(server_url, pat, project, repository_name, branch_name, batch_size=50):
+def tag_row(tag, tag_details, commit_details):
+    tag_date, tag_time = tag_details['taggedBy']['date'].split('T')
+    tag_time = tag_time.split('Z')[0]
+    return {
+        'Tag Name': tag['name'].replace('refs/tags/', ''),
+        'Tag ID': tag['objectId'],
+        'Tag Message': tag_details['message'],
+        'Commit ID': tag_details['taggedObject']['objectId'],
+        'Commit Message': commit_details['comment'],
+        'Author': tag_details['taggedBy']['name'],
+        'Date & Time': f"{tag_date} {tag_time}"
+    }
+
+
+def process(server_url, pat, project, repository_name, branch_names=None, batch_size=50, branch_deadline=None, fast=False, scope=None, folder_depth=DEFAULT_FOLDER_DEPTH):
+    """Discover one repository: repository-wide data (commit store, all commits, tags, branch stats) is fetched
+    once and every requested branch, or every branch when branch_names is empty, is processed against it.
+
+    Each branch is bounded by branch_deadline seconds. In fast mode no commit history is read: the commits
+    sheets stay empty and items show their branch head instead of their last change.
+    With scope (a PathScope), items, path history, sizes and commits are restricted to its subtrees.
+    Folder totals are rolled up to folder_depth levels below the root for the folders sheet.
+    """
     api_version = '6.0'  # Adjust if your server uses a different version
 
     # Debug information
     print(f"Server URL: {server_url}")
     print(f"Project: {project}")
     print(f"Repo: {repository_name}")
-    print(f"Branch: {branch_name}")
+    print(f"Branches: {branch_names or 'all'}")
 
-    repositories = get_repositories(server_url, project, pat, api_version, batch_size)
+    repositories = get_project_repositories(server_url, project, pat, api_version, batch_size)
     if isinstance(repositories, list):  # Check that repositories is a list
         for repo in repositories:
             if isinstance(repo, dict) and repo.get('name') == repository_name:
@@ -580,86 +954,137 @@ def process(server_url, pat, project, repository_name, branch_name, batch_size=5
                 data_commits = []
                 data_all_commits = []
                 data_tags = []
+                data_branch_stats = []
+                data_folders = []
 
                 # Get branches and retrieve latest commits in batch
                 branches = get_branches(server_url, project, repo_id, pat, api_version, batch_size=batch_size)
-                branch_names = [branch['name'].replace('refs/heads/', '') for branch in branches] if branch_name is None else [branch_name]
-
-                # Fetch latest commits for each branch
-                latest_commits = get_latest_commit_info(server_url, project, repo_id, branch_names, pat, api_version)
+                branch_names = [branch['name'].replace('refs/heads/', '') for branch in branches] if not branch_names else branch_names
+
+                # Branches whose head has not moved since the last run are reused from the saved state without requests
+                heads = {branch['name'].replace('refs/heads/', ''): branch['objectId'] for branch in branches}
+                state = discovery_state.get_state()
+                # A scoped discovery keeps its own state, apart from the whole-repository one
+                state_names = {branch: f"{branch} [{scope.key()}]" if scope else branch for branch in branch_names}
+                previous_state = {}
+                if state:
+                    for branch in branch_names:
+                        previous = state.load_branch(server_url, project, repository_name, state_names[branch])
+                        if previous:
+                            previous_state[branch] = previous
+                unchanged = {branch for branch, previous in previous_state.items() if previous['head'] == heads.get(branch)}
+
+                # Commits are fetched once per repository; the default branch goes first as most branches share its history
+                store = CommitStore()
+                # Commits recorded by earlier runs are immutable, so only commits newer than them are listed
+                for commit in state.load_commits(server_url, project, repository_name) if state else []:
+                    store.add(commit)
+                # Tree objects are shared the same way, so each branch only lists the subtrees it does not share
+                trees = TreeCache()
+                # Change lists by commit ID, so commits shared by several branches are read and decoded once
+                commit_changes = {}
+                # Per branch, the commits that changed something within the scope
+                scoped_commit_ids = {}
+
+                # Resolve the heads of changed branches in bulk
+                latest_commits = get_latest_commit_info(server_url, project, repo_id, [branch for branch in branch_names if branch not in unchanged], heads, store, pat, api_version)
+                latest_commits.update((branch, previous_state[branch]['commit_info']) for branch in unchanged)
+                default_branch = repo.get('defaultBranch', '').replace('refs/heads/', '')
+                default_head = heads.get(default_branch)
+                default_commits = []
+                if default_head and not fast:
+                    with deadlines.phase(f"{repository_name}/{default_branch}", branch_deadline):
+                        default_commits = collect_branch_commits(server_url, project, repo_id, default_branch, default_head, store, pat, api_version, batch_size=batch_size)
 
                 for branch in branch_names:
-                    commit_info = latest_commits.get(branch)
-                    if commit_info:
-                        commit_id = commit_info['commitId']
-                        comment = commit_info['comment']
-                        author = commit_info['author']
-                        last_modified = commit_info['date']
-
-                        # Retrieve all commits for the branch
-                        commits = get_all_commits(server_url, project, repo_id, branch, pat, api_version, batch_size=batch_size)
-                        for commit in commits:
-                            commit_data = {
-                                'Collection Name': server_url.split('/')[-1],
-                                'Project Name': project,
-                                'Repository Name': repository_name,
-                                'Branch Name': branch,
-                                'Commit ID': commit['commitId'],
-                                'Commit Message': commit['comment'],
-                                'Author': commit['author']['name'],
-                                'Commit Date': commit['author']['date']
-                            }
-                            data_commits.append(commit_data)
-
-                        # Get files in branch and retrieve file size and commit count in batch
-                        files = get_files_in_branch(server_url, project, repo_id, branch, pat, api_version, batch_size=batch_size)
-                        sha1_list = [file['objectId'] for file in files if not file.get('isFolder', file['gitObjectType'] == 'tree')]
-                        file_sizes = get_file_size(server_url, project, repo_id, sha1_list, pat, api_version)
-
-                        file_paths = [file['path'] for file in files if not file.get('isFolder', file['gitObjectType'] == 'tree')]
-                        commit_counts = get_commit_count(server_url, project, repo_id, file_paths, pat, api_version)
-
-                        for file in files:
-                            is_folder = file.get('isFolder', file['gitObjectType'] == 'tree')
-                            file_path = file['path']
-                            sha1 = file['objectId'] if not is_folder else None
-                            size = file_sizes.get(sha1, 0)
-                            commit_count = commit_counts.get(file_path, 0)
-
-                            file_info = {
-                                'Collection Name': server_url.split('/')[-1],
-                                'Project Name': project,
-                                'Repository Name': repository_name,
-                                'Branch Name': branch,
-                                'File Name': file_path.split('/')[-1],
-                                'File Type': 'Folder' if is_folder else 'File',
-                                'Folder Level': file_path.count('/') - 1,
-                                'Path': file_path,
-                                'Size (Bytes)': int(size),
-                                'Last Modified Time': last_modified,
-                                'Author': author,
-                                'Comments': comment,
-                                'Commit ID': commit_id,
-                                'Commit Count': commit_count
-                            }
-                            data_source_code.append(file_info)
-
-                # Retrieve all commits in the repository
-                all_commits = get_all_repo_commits(server_url, project, repo_id, pat, api_version, batch_size=batch_size)
+                    with deadlines.phase(f"{repository_name}/{branch}", branch_deadline):
+                        commit_info = latest_commits.get(branch)
+                        if commit_info:
+                            # Retrieve all commits for the branch
+                            commits = [] if fast else collect_branch_commits(server_url, project, repo_id, branch, commit_info['commitId'], store, pat, api_version, batch_size=batch_size)
+                            previous = previous_state.get(branch)
+                            scoped_ids = None
+                            if scope and not fast:
+                                if branch in unchanged:
+                                    saved_ids = previous.get('scoped_ids')
+                                    scoped_ids = set(saved_ids) if saved_ids is not None else None
+                                else:
+                                    scoped_ids = get_scope_commit_ids(server_url, project, repo_id, branch, scope, pat, api_version, batch_size=batch_size)
+                                scoped_commit_ids[branch] = scoped_ids
+                            for commit in commits:
+                                if scoped_ids is None or commit['commitId'] in scoped_ids:
+                                    data_commits.append(commit_row(server_url, project, repository_name, branch, commit))
+
+                            diff_applied = False
+                            if branch in unchanged:
+                                logger.info(f"Branch '{branch}' unchanged since run {previous['run_id']}; reusing its items and history")
+                                files, history = previous['files'], PathHistory(previous['history'])
+                            elif fast:
+                                files, history = get_branch_items(server_url, project, repo_id, branch, commit_info['commitId'], trees, pat, api_version, batch_size=batch_size, scope=scope), PathHistory()
+                            else:
+                                files, history, diff_applied = get_branch_items_and_history(
+                                    server_url, project, repo_id, branch, commit_info['commitId'], commits, previous, trees, pat, api_version, batch_size=batch_size,
+                                    scope=scope, scoped_ids=scoped_ids, commit_changes=commit_changes)
+                            # Incomplete listings are reported as far as they go but never recorded as the branch's state
+                            complete = files is not None and history is not None
+                            if not complete:
+                                logger.warning(f"Branch '{branch}' could not be read in full; it is not recorded for the next run")
+                            files = files or []
+                            history = history or PathHistory()
+
+                            # Retrieve file sizes in batch
+                            sha1_list = [file['objectId'] for file in files if not file.get('isFolder', file['gitObjectType'] == 'tree')]
+                            root_tree_id = next((file['objectId'] for file in files if file['path'] == '/'), None)
+                            # After a diff only the few new blobs are unsized; listing the whole tree for them would undo the diff's savings
+                            file_sizes = get_file_size(server_url, project, repo_id, sha1_list, pat, api_version,
+                                                       tree_id=None if diff_applied else root_tree_id)
+
+                            rollup = FolderRollup()
+                            for file in files:
+                                is_folder = file.get('isFolder', file['gitObjectType'] == 'tree')
+                                sha1 = file['objectId'] if not is_folder else None
+                                data_source_code.append(source_code_row(
+                                    server_url, project, repository_name, branch, file['path'], is_folder,
+                                    file_sizes.get(sha1, 0), commit_info, history.get(file['path'])))
+                                if not is_folder:
+                                    rollup.add_file(file['path'], file_sizes.get(sha1, 0))
+                            data_folders.extend(rollup.rows(server_url, project, repository_name, branch, folder_depth))
+
+                            # A branch cut short by its deadline, or whose history is not fully linked in the store, is not
+                            # recorded, so the next run discovers it again
+                            remaining = deadlines.remaining()
+                            if (state and branch not in unchanged and complete and files and commits
+                                    and store.is_complete(commit_info['commitId']) and (remaining is None or remaining > 0)):
+                                state.save_branch(server_url, project, repository_name, state_names[branch], commit_info['commitId'], root_tree_id,
+                                                  {'commit_info': commit_info, 'files': files, 'history': history.entries,
+                                                   'scoped_ids': sorted(scoped_ids) if scoped_ids is not None else None})
+
+                # Retrieve all commits in the repository (the default branch's history, collected above)
+                if fast:
+                    all_commits = []
+                elif default_head:
+                    all_commits = default_commits
+                else:
+                    all_commits = get_all_repo_commits(server_url, project, repo_id, pat, api_version, batch_size=batch_size)
+                if scope and default_head and not fast:
+                    if default_branch not in scoped_commit_ids:
+                        scoped_commit_ids[default_branch] = get_scope_commit_ids(server_url, project, repo_id, default_branch, scope, pat, api_version, batch_size=batch_size)
+                    if scoped_commit_ids[default_branch] is not None:
+                        all_commits = [commit for commit in all_commits if commit['commitId'] in scoped_commit_ids[default_branch]]
                 for commit in all_commits:
-                    all_commit_info = {
-                        'Author': commit['author']['name'],
-                        'Commit Message': commit['comment'],
-                        'Commit ID': commit['commitId'],
-                        'Commit Date': commit['author']['date'],
-                        'Tag Name': 'not tagged'  # Placeholder, will update if tags found
-                    }
-                    data_all_commits.append(all_commit_info)
-
-                # Retrieve tags for the repository and fetch tag details in batch
+                    data_all_commits.append(all_commit_row(commit))
+                if state:
+                    state.save_commits(server_url, project, repository_name, list(store.commits.values()))
+
+                # Retrieve peeled tags for the repository, then annotated-tag objects and their commits in bulk
                 tags = get_tags(server_url, project, repo_id, pat, api_version, batch_size=batch_size)
-                tag_ids = [tag['objectId'] for tag in tags]
+                annotated = [tag for tag in tags if tag.get('peeledObjectId')]
+                # Servers that ignore peelTags mark no tag as annotated, so every tag is looked up as before
+                tag_ids = [tag['objectId'] for tag in annotated or tags]
                 tag_details_map = get_tag_details(server_url, project, repo_id, tag_ids, pat, api_version)
+                tagged_commits = get_commits_by_id(
+                    server_url, project, repo_id, [details['taggedObject']['objectId'] for details in tag_details_map.values()],
+                    store, pat, api_version)
 
                 commit_tag_map = map_commit_tags(tags)  # Map for quick tag lookup by commit ID
 
@@ -667,29 +1092,172 @@ def process(server_url, pat, project, repository_name, branch_name, batch_size=5
                     tag_id = tag['objectId']
                     tag_details = tag_details_map.get(tag_id)
                     if tag_details:
-                        commit_details = get_commit_details(server_url, project, repo_id, tag_details['taggedObject']['objectId'], pat, api_version)
+                        commit_details = tagged_commits.get(tag_details['taggedObject']['objectId'])
                         if commit_details:
-                            tag_date, tag_time = tag_details['taggedBy']['date'].split('T')
-                            tag_time = tag_time.split('Z')[0]
-                            tag_info = {
-                                'Tag Name': tag['name'].replace('refs/tags/', ''),
-                                'Tag ID': tag['objectId'],
-                                'Tag Message': tag_details['message'],
-                                'Commit ID': tag_details['taggedObject']['objectId'],
-                                'Commit Message': commit_details['comment'],
-                                'Author': tag_details['taggedBy']['name'],
-                                'Date & Time': f"{tag_date} {tag_time}"
-                            }
-                            data_tags.append(tag_info)
+                            data_tags.append(tag_row(tag, tag_details, commit_details))
 
                 # Update all_commit_info with tag names using commit_tag_map
                 for commit in data_all_commits:
                     commit['Tag Name'] = commit_tag_map.get(commit['Commit ID'], 'not tagged')
 
-                return data_source_code, data_commits, data_all_commits, data_tags
+                # Staleness of the requested branches relative to the default branch, from one listing
+                requested = set(branch_names)
+                for stat in get_branch_stats(server_url, project, repo_id, pat, api_version):
+                    if stat['name'] in requested:
+                        data_branch_stats.append(branch_stats_row(server_url, project, repository_name, stat))
+
+                return data_source_code, data_commits, data_all_commits, data_tags, data_branch_stats, data_folders
 
     # Return empty data if no repositories or data found
-    return [], [], [], []
+    return [], [], [], [], [], []
+
+
+def process_delta(server_url, pat, project, repository_name, branch_names=None, batch_size=50, since=None, until=None):
+    """Commits dated within since..until on each requested branch (every branch when branch_names is empty),
+    and the ref moves pushed within the window, for delta reports between syncs.
+
+    Only branches pushed to since `since` can hold commits of the window, so only their listings are read.
+    """
+    api_version = '6.0'
+    data_commits = []
+    data_ref_moves = []
+
+    repositories = get_project_repositories(server_url, project, pat, api_version, batch_size)
+    repo = next((r for r in repositories if isinstance(r, dict) and r.get('name') == repository_name), None)
+    if repo is None:
+        return data_commits, data_ref_moves
+    repo_id = repo['id']
+
+    # Pushes up to now rather than until: a commit of the window may have been pushed after it closed
+    moved = set()
+    for push in get_pushes(server_url, project, repo_id, pat, api_version, batch_size=batch_size, from_date=since):
+        for ref_update in push.get('refUpdates', []):
+            moved.add(ref_update['name'].replace('refs/heads/', ''))
+            if not until or push['date'][:19] <= until[:19]:
+                data_ref_moves.append(ref_move_row(server_url, project, repository_name, push, ref_update))
+
+    if not branch_names:
+        branch_names = [branch['name'].replace('refs/heads/', '') for branch in get_branches(server_url, project, repo_id, pat, api_version, batch_size=batch_size)]
+    for branch in branch_names:
+        if since and branch not in moved:
+            continue
+        listing = get_all_commits(server_url, project, repo_id, branch, pat, api_version, batch_size=batch_size, from_date=since, to_date=until)
+        for commit in listing:
+            data_commits.append(commit_row(server_url, project, repository_name, branch, commit))
+    logger.info(f"Delta of '{repository_name}': {len(data_commits)} commits and {len(data_ref_moves)} ref moves")
+    return data_commits, data_ref_moves
+
+
+def process_mirror(server_url, pat, project, repository_name, branch_names=None, batch_size=50, branch_deadline=None, fast=False, scope=None, folder_depth=DEFAULT_FOLDER_DEPTH):
+    """Same sheets as process(), computed from a local mirror of the repository with git plumbing.
+
+    Only the repository lookup goes through the REST API; files, sizes, commits and tags come from a single
+    clone (or fetch into the cached mirror) instead of one request per file, branch and tag. branch_deadline
+    and fast are accepted for symmetry; local work needs no per-branch bound and history costs no requests.
+    """
+    api_version = '6.0'
+
+    print(f"Server URL: {server_url}")
+    print(f"Project: {project}")
+    print(f"Repo: {repository_name}")
+    print(f"Branches: {branch_names or 'all'}")
+
+    repositories = get_project_repositories(server_url, project, pat, api_version, batch_size)
+    repo = next((r for r in repositories if isinstance(r, dict) and r.get('name') == repository_name), None)
+    if repo is None:
+        return [], [], [], [], [], []
+
+    mirror = git_mirror.GitMirror(repo['remoteUrl'], pat)
+    try:
+        mirror.sync()
+    except git_mirror.GitError as e:
+        logger.error(f"Could not mirror repository '{repository_name}': {e}")
+        return [], [], [], [], [], []
+
+    data_source_code = []
+    data_commits = []
+    data_all_commits = []
+    data_tags = []
+    data_branch_stats = []
+    data_folders = []
+
+    heads = mirror.branches()
+    branch_names = list(heads) if not branch_names else branch_names
+    default_branch = repo.get('defaultBranch', 'HEAD')
+
+    # One walk over all branches loads every commit once; branch membership then follows parent links
+    store = CommitStore()
+    changes = {}
+    if heads:
+        for commit, paths in mirror.commits_with_changes('--branches'):
+            store.add(commit)
+            changes[commit['commitId']] = paths
+
+    for branch in branch_names:
+        head = heads.get(branch)
+        if head is None:
+            logger.info(f"Branch '{branch}' not found in repository '{repository_name}'.")
+            continue
+        latest = store.get(head)
+        commit_info = {
+            'commitId': latest['commitId'],
+            'comment': latest['comment'],
+            'author': latest['author']['name'],
+            'date': latest['author']['date']
+        }
+
+        # The branch's commits and every path's commit count and last change come from the same walk
+        history = PathHistory()
+        for commit in store.walk(head):
+            paths = scope.filter_paths(changes[commit['commitId']]) if scope else changes[commit['commitId']]
+            if scope and not paths:
+                continue
+            data_commits.append(commit_row(server_url, project, repository_name, branch, commit))
+            history.add_commit(commit, paths)
+
+        items = scope.filter_items(mirror.tree(head)) if scope else mirror.tree(head)
+        # Sizes read locally also serve later REST runs
+        blob_sizes.get_index().put_many({item['objectId']: item['size'] for item in items
+                                         if item['gitObjectType'] == 'blob'})
+        rollup = FolderRollup()
+        for item in items:
+            data_source_code.append(source_code_row(
+                server_url, project, repository_name, branch, item['path'], item['isFolder'], item['size'],
+                commit_info, history.get(item['path'])))
+            if not item['isFolder']:
+                rollup.add_file(item['path'], item['size'])
+        data_folders.extend(rollup.rows(server_url, project, repository_name, branch, folder_depth))
+
+    default_head = heads.get(default_branch.replace('refs/heads/', ''))
+    all_commits = store.walk(default_head) if default_head else (mirror.commits(default_branch) if heads else [])
+    if scope:
+        all_commits = [commit for commit in all_commits if scope.filter_paths(changes.get(commit['commitId'], []))]
+    for commit in all_commits:
+        data_all_commits.append(all_commit_row(commit))
+
+    tags = mirror.tags()
+    # Only annotated tags have tag details, as with the annotatedtags endpoint
+    annotated = [tag for tag in tags if 'taggedBy' in tag]
+    tagged_ids = list(dict.fromkeys(tag['taggedObject']['objectId'] for tag in annotated))
+    tagged_commits = {}
+    if tagged_ids:
+        tagged_commits = {commit['commitId']: commit for commit in mirror.commits(*tagged_ids, no_walk=True)}
+    for tag in annotated:
+        commit_details = tagged_commits.get(tag['taggedObject']['objectId'])
+        if commit_details:
+            data_tags.append(tag_row(tag, tag, commit_details))
+
+    commit_tag_map = map_commit_tags(tags)
+    for commit in data_all_commits:
+        commit['Tag Name'] = commit_tag_map.get(commit['Commit ID'], 'not tagged')
+
+    if default_head:
+        requested = set(branch_names)
+        for stat in mirror.branch_stats(default_branch.replace('refs/heads/', '')):
+            if stat['name'] in requested:
+                data_branch_stats.append(branch_stats_row(server_url, project, repository_name, stat))
+
+    return data_source_code, data_commits, data_all_commits, data_tags, data_branch_stats, data_folders
 
 
 
@@ -702,7 +1270,7 @@ def construct_input(df):
             continue
 
         server_url = row['Server URL'].rstrip('/')
-        pat = row['PAT']
+        pat = primary_pat(row['PAT'])
         project_name = row.get('Project Name')
         repo_name = row.get('Repository Name')
         branch_name = row.get('Branch Name')
@@ -747,6 +1315,12 @@ def construct_input(df):
             # Add branch if specified and unique
             if branch_name and branch_name not in repo["branches"]:
                 repo["branches"].append(branch_name)
+
+            # Scope paths and globs of every row of the repository are combined
+            for key, column in SCOPE_COLUMNS.items():
+                for value in split_patterns(row.get(column)):
+                    if value not in repo.setdefault(key, []):
+                        repo[key].append(value)
         else:
             # If repo is not specified, retrieve repos for the project
             for repo_name in get_repo_names_by_project(devops_server_url=server_url, pat=pat, project_name=project_name):
@@ -759,8 +1333,157 @@ def construct_input(df):
     return dict(result)
 
 
-def main():
+def discover_repository(server_url, pat, proj_name, repo_name, branches, output_directory, start_time, engine='rest', branch_deadline=None, fast=False, window=None, scope=None, folder_depth=DEFAULT_FOLDER_DEPTH):
+    """Discover one repository and write its workbook; returns the repository's row of the run summary.
+
+    With window, a (since, until) pair, only the delta report of that time window is written.
+    """
+    status = {'Server URL': server_url, 'Project Name': proj_name, 'Repository Name': repo_name,
+              'Status': 'completed', 'Report': '', 'Error': ''}
+    repo_start = datetime.now()
+    process_repo = process_mirror if engine == 'mirror' else process
+    try:
+        if window:
+            data_commits, data_ref_moves = process_delta(server_url, pat, proj_name, repo_name, branches, since=window[0], until=window[1])
+            file_id = str(int(datetime.now().strftime("%Y%m%d%H%M%S")))
+            output_path = os.path.join(output_directory, f"{proj_name}_{repo_name}__git_delta_report_{file_id}.xlsx")
+            generate_delta_report(data_commits, data_ref_moves, output_path, window[0], window[1])
+            print(f'Delta report generated: {output_path}')
+            status['Report'] = output_path
+            return status
+        # One call per repository: repo-wide data is fetched once for all listed branches (all branches if none)
+        master_data_source_code, master_data_commits, master_data_all_commits, master_data_tags, master_data_branch_stats, master_data_folders = process_repo(
+            server_url, pat, proj_name, repo_name, branches, branch_deadline=branch_deadline, fast=fast, scope=scope, folder_depth=folder_depth)
+        file_id = str(int(datetime.now().strftime("%Y%m%d%H%M%S")))
+        output_filename = f"{proj_name}_{repo_name}__git_discovery_report_{file_id}.xlsx"
+        output_path = os.path.join(output_directory, output_filename)
+        generate_report(master_data_source_code, master_data_commits, master_data_all_commits, master_data_tags,output_path, proj_name, repo_name, server_url, start_time, master_data_branch_stats, master_data_folders)
+        print(f'Report generated: {output_path}')
+        status['Report'] = output_path
+
+        # Clear data and enforce garbage collection after each repository's report is generated
+        master_data_source_code.clear()
+        master_data_commits.clear()
+        master_data_all_commits.clear()
+        master_data_tags.clear()
+        master_data_branch_stats.clear()
+        master_data_folders.clear()
+    except MemoryError:
+        logger.error(f"Memory ceiling reached while processing repository '{repo_name}' in project '{proj_name}'")
+        status.update({'Status': 'failed', 'Error': 'memory ceiling reached'})
+    except Exception as e:
+        logger.error(f"Error occurred while processing repository '{repo_name}' in project '{proj_name}': {e}")
+        status.update({'Status': 'failed', 'Error': str(e)})
+    finally:
+        metrics.reset()
+        gc.collect()  # Enforce garbage collection
+        gc.collect()
+        status['Duration (s)'] = round((datetime.now() - repo_start).total_seconds(), 1)
+        status['Peak Memory (MB)'] = worker_pool.peak_memory_mb()
+    return status
+
+
+def failed_repository(job, error):
+    """Summary row of a repository whose worker process died before reporting back."""
+    server_url, _, proj_name, repo_name = job[:4]
+    return {'Server URL': server_url, 'Project Name': proj_name, 'Repository Name': repo_name,
+            'Status': 'failed', 'Report': '', 'Error': f"worker process failed: {error}"}
+
+
+def configure_run(args, df, run_id):
+    """Process-wide settings of a run, applied in the main process or in each worker process."""
+    http_client.set_request_deadline(args.request_deadline)
+    http_client.enable_hedging(args.hedge)
+    if args.rate_limit:
+        rate_limiter.set_rate(args.rate_limit)
+    # Trees, blobs, commits and annotated tags are addressed by ID, so reruns read them from the response cache
+    response_cache.enable()
+    # Record each branch's head and tree, and skip or extend branches recorded by earlier runs
+    discovery_state.enable(run_id, reuse=not args.full)
+    apply_concurrency_settings(df)
+    apply_token_pools(df)
+
+
+def init_worker(args, df, run_id):
+    configure_run(args, df, run_id)
+    worker_pool.limit_memory(args.worker_memory)
+
+
+def write_single_sheet_report(rows, columns, sheet_name, output_path):
+    with pd.ExcelWriter(output_path, engine='openpyxl') as writer:
+        pd.DataFrame(rows, columns=columns).to_excel(writer, sheet_name=sheet_name, index=False)
+    workbook = load_workbook(output_path)
+    sheet = workbook[sheet_name]
+    apply_header_styles(workbook, sheet_name)
+    apply_black_border(sheet)
+    remove_gridlines(sheet)
+    adjust_column_width(sheet)
+    align_cells(sheet)
+    workbook.save(output_path)
+
+
+def write_run_summary(statuses, output_path):
+    """One row per repository of the run: status, workbook, duration and peak memory of its process."""
+    columns = ['Server URL', 'Project Name', 'Repository Name', 'Status', 'Report', 'Duration (s)', 'Peak Memory (MB)', 'Error']
+    write_single_sheet_report(statuses, columns, 'run_summary', output_path)
+
+
+def run_quick_scan(input_data, output_path):
+    """Sizing sheet of every listed repository from repository metadata alone, to pick those worth a full discovery."""
+    rows = []
+    for server_url, server_data in input_data.items():
+        for project in server_data["projects"]:
+            print(f"Scanning project {project['name']}")
+            rows.extend(quick_scan.scan_project(server_url, project["name"], server_data["pat"],
+                                                [repo["name"] for repo in project["repos"]]))
+    write_single_sheet_report(rows, quick_scan.QUICK_SCAN_COLUMNS, 'quick_scan', output_path)
+    print(f"Quick scan generated: {output_path} ({len(rows)} repositories)")
+
+
+# Wall-clock bound (seconds) on discovering one branch; requests past it fail fast and the branch is reported as far as it got
+BRANCH_DEADLINE = 4 * 3600
+
+
+def window_date(value):
+    """--since/--until value: an ISO 8601 date or date-time (local time unless it has an offset), as UTC."""
+    moment = datetime.fromisoformat(value.replace('Z', '+00:00'))
+    return moment.astimezone(timezone.utc).strftime('%Y-%m-%dT%H:%M:%SZ')
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Discover Git repositories listed in git_discovery_input_form.xlsx")
+    parser.add_argument('--engine', choices=['rest', 'mirror'], default='rest',
+                        help="'mirror' computes the report from a local git mirror of each repository")
+    parser.add_argument('--hedge', action='store_true',
+                        help="send a duplicate GET when a request runs past the endpoint's observed p95")
+    parser.add_argument('--request-deadline', type=float, default=http_client.REQUEST_DEADLINE,
+                        help="seconds one request may take including its retries")
+    parser.add_argument('--rate-limit', type=float, default=None,
+                        help="requests per second sent to each server from the start (default: unpaced until it throttles)")
+    parser.add_argument('--branch-deadline', type=float, default=BRANCH_DEADLINE,
+                        help="seconds the discovery of one branch may take")
+    parser.add_argument('--full', action='store_true',
+                        help="ignore the state saved by earlier runs and rediscover every branch")
+    parser.add_argument('--since', type=window_date, default=None,
+                        help="write delta reports of the commits and ref moves since this date-time instead")
+    parser.add_argument('--until', type=window_date, default=None,
+                        help="end of the delta window (default: now)")
+    parser.add_argument('--quick', action='store_true',
+                        help="only write a sizing sheet from repository metadata (size, branch and tag counts, last push)")
+    parser.add_argument('--fast', action='store_true',
+                        help="skip commit histories; branch staleness comes from the branch_stats sheet alone")
+    parser.add_argument('--workers', type=int, default=1,
+                        help="repositories discovered in parallel, each in its own process (1 runs in this process)")
+    parser.add_argument('--worker-memory', type=int, default=None,
+                        help="memory ceiling in MB of each worker process")
+    parser.add_argument('--folder-depth', type=int, default=DEFAULT_FOLDER_DEPTH,
+                        help="folder levels below the root listed with their total sizes in the folders sheet")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
     input_file = r'git_discovery_input_form.xlsx'
+    args = parse_args(argv)
     try:
         run_id = str(int(datetime.now().strftime("%Y%m%d%H%M%S")))
         output_directory = os.path.join("Git", run_id)
@@ -777,6 +1500,9 @@ def main():
         df['PAT'] = df['PAT'].fillna('').str.strip()
         df['Repository Name'] = df['Repository Name'].fillna('').str.strip()
         df['Branch Name'] = df['Branch Name'].fillna('').str.strip()
+        for column in SCOPE_COLUMNS.values():
+            if column in df.columns:
+                df[column] = df[column].fillna('').astype(str).str.strip()
 
         # Form the input data in below format
         # Sample format below
@@ -798,45 +1524,42 @@ def main():
                }
             }
         """
+        configure_run(args, df, run_id)
         input_data = construct_input(df)
         print(f"Final input combination: {input_data}")
 
+        if args.quick:
+            run_quick_scan(input_data, os.path.join(output_directory, f"git_quick_scan_{run_id}.xlsx"))
+            return
+
+        # --since/--until switch every repository to a delta report of that window
+        window = (args.since, args.until) if args.since or args.until else None
+        jobs = []
         for server_url, server_data in input_data.items():
             start_time = datetime.now()
             pat = server_data["pat"]
             for project in server_data["projects"]:
                 proj_name = project["name"]
-                print(f"Processing project {proj_name}")
-                try:
-                    for repo in project["repos"]:
-                        master_data_source_code = []
-                        master_data_commits = []
-                        master_data_all_commits = []
-                        master_data_tags = []
-                        repo_name = repo["name"]
-                        branches = repo.get("branches", [])
-                        # If branches exist, iterate through them; otherwise, use an empty string for branch_name
-                        for branch_name in branches if branches else [None]:
-                            data_source_code, data_commits, data_all_commits, data_tags = process(server_url, pat, proj_name, repo_name, branch_name)
-                            master_data_source_code = master_data_source_code + data_source_code
-                            master_data_commits = master_data_commits + data_commits
-                            master_data_all_commits = master_data_all_commits + data_all_commits
-                            master_data_tags = master_data_tags + data_tags
-                        file_id = str(int(datetime.now().strftime("%Y%m%d%H%M%S")))
-                        output_filename = f"{proj_name}_{repo_name}__git_discovery_report_{file_id}.xlsx"
-                        output_path = os.path.join(output_directory, output_filename)
-                        generate_report(master_data_source_code, master_data_commits, master_data_all_commits, master_data_tags,output_path, proj_name, repo_name, server_url, start_time)
-                        print(f'Report generated: {output_path}')
-
-                        # Clear data and enforce garbage collection after each repository's report is generated
-                        master_data_source_code.clear()
-                        master_data_commits.clear()
-                        master_data_all_commits.clear()
-                        master_data_tags.clear()
-                        gc.collect()  # Enforce garbage collection
-                        gc.collect()
-                except Exception as e:
-                    logger.error(f"Error occurred while processing project '{proj_name}': {e}")
+                for repo in project["repos"]:
+                    scope = PathScope(repo.get("scope_paths"), repo.get("include_globs"), repo.get("exclude_globs"))
+                    jobs.append((server_url, pat, proj_name, repo["name"], repo.get("branches", []), output_directory,
+                                 start_time, args.engine, args.branch_deadline, args.fast, window, scope or None, args.folder_depth))
+
+        if args.workers > 1:
+            # Repositories are independent, so each runs in a worker process that writes its own workbook
+            print(f"Discovering {len(jobs)} repositories with {args.workers} worker processes")
+            statuses = list(worker_pool.run_jobs(discover_repository, jobs, args.workers, initializer=init_worker,
+                                                 initargs=(args, df, run_id), on_failure=failed_repository))
+        else:
+            statuses = []
+            for job in jobs:
+                print(f"Processing project {job[2]}")
+                statuses.append(discover_repository(*job))
+
+        summary_path = os.path.join(output_directory, f"git_discovery_run_summary_{run_id}.xlsx")
+        write_run_summary(statuses, summary_path)
+        failed = sum(status['Status'] != 'completed' for status in statuses)
+        print(f"Run summary generated: {summary_path} ({len(statuses) - failed} completed, {failed} failed)")
     except Exception as e:
         logger.error(f"Error occurred while processing input file '{input_file}': {e}")
         return
@@ -1,12 +1,13 @@
 import os
 import re
-import requests
-from requests.auth import HTTPBasicAuth
 import pandas as pd
 from datetime import datetime
 import getpass
 import time
-from utils.common import get_project_names, add_if_not_exists
+from utils.common import get_project_names, add_if_not_exists, apply_concurrency_settings, apply_token_pools
+from utils import http_client, async_engine, rate_limiter, response_cache, metrics
+from utils.json_stream import iter_json_array
+from utils.token_pool import primary_pat
 import logging
 
 
@@ -81,19 +82,23 @@ def modify_item_path(url):
         return url
 
 
-def make_request_with_retries(url, auth, max_retries=10, timeout=300):
+def make_request_with_retries(url, pat, max_retries=10, timeout=300, stream=False):
     url = modify_item_path(url)
     print(url)
     logger.info(f"Making request to URL: {url}")
     for attempt in range(max_retries):
         try:
-            response = requests.get(url, auth=auth, timeout=timeout)
+            response = http_client.get(url, pat, timeout=timeout, stream=stream)
             if response.status_code == 200:
                 logger.info(f"Request successful with status code: {response.status_code}")
                 return response
+            elif response.status_code in (400, 401, 403, 404):
+                logger.warning(f"Request failed with status code {response.status_code}. Not retrying.")
+                return None
             else:
-                logger.warning(f"Attempt {attempt + 1}: Request timed out. Retrying...")
-                time.sleep(2 ** attempt)
+                delay = rate_limiter.retry_delay(response, attempt)
+                logger.warning(f"Attempt {attempt + 1}: Request failed with status code {response.status_code}. Retrying in {delay:.1f}s...")
+                time.sleep(delay)
         except Exception as e:
             logger.error(f"Error during request: {e}")
             break
@@ -127,7 +132,7 @@ def extract_organization_name(server_url):
 def get_shelvesets_details(server_url, pat):
     try:
         url = f"{server_url}/_apis/tfvc/shelvesets?api-version=6.0"
-        response = make_request_with_retries(url, auth=HTTPBasicAuth('', pat))
+        response = make_request_with_retries(url, pat)
         return response.json().get('value', []) if response else []
     except Exception as e:
         logger.error(f"Failed to retrieve shelvesets: {e}")
@@ -138,7 +143,7 @@ def get_shelvesets_details(server_url, pat):
 def get_changeset_details(server_url, project_name, changeset_id, pat):
     try:
         url = f"{server_url}/{project_name}/_apis/tfvc/changesets/{changeset_id}?api-version=6.0"
-        response = make_request_with_retries(url, auth=HTTPBasicAuth('', pat))
+        response = make_request_with_retries(url, pat)
         return response.json() if response else None
     except Exception as e:
         logger.error(f"Failed to retrieve changeset {changeset_id} details: {e}")
@@ -148,7 +153,7 @@ def get_changeset_details(server_url, project_name, changeset_id, pat):
 # Function to get changeset changes
 def get_changeset_changes(server_url, changeset_id, pat):
     url = f"{server_url}/_apis/tfvc/changesets/{changeset_id}/changes?api-version=6.0"
-    response = make_request_with_retries(url, auth=HTTPBasicAuth('', pat))
+    response = make_request_with_retries(url, pat)
     if response.status_code == 200:
         print(response.status_code)
         return response.json()
@@ -166,45 +171,44 @@ def determine_file_type(item):
     return 'File'
 
 
+# Item fields kept from full-recursion listings; everything else is dropped while parsing
+ITEM_FIELDS = ('path', 'isFolder', 'size')
+
+
+# Function to stream the items of a TFVC path, skipping excluded paths as they arrive
+def iter_branch_items(devops_server_url, project_name, branch_path, pat, exclude_paths=()):
+    items_api_url = f'{devops_server_url}/{project_name}/_apis/tfvc/items?scopePath={branch_path}&recursionLevel=full&api-version=6.0'
+    items_response = make_request_with_retries(items_api_url, pat, stream=True)
+    if items_response is None:
+        raise ValueError(f"No response for items of '{branch_path}'")
+    logger.info(f"Request successful with branch status code: {items_response.status_code}")
+    for item in iter_json_array(items_response, fields=ITEM_FIELDS):
+        if not any(item['path'].startswith(excluded_path) for excluded_path in exclude_paths):
+            yield item
+
+
 # Function to get file count for a TFVC branch
 def get_tfvc_branch_file_count(devops_server_url, project_name, branch_path, pat, exclude_paths=[]):
     try:
-        items_api_url = f'{devops_server_url}/{project_name}/_apis/tfvc/items?scopePath={branch_path}&recursionLevel=full&api-version=6.0'
-        items_response = make_request_with_retries(items_api_url, auth=HTTPBasicAuth('', pat))
-        if items_response.status_code == 200:
-            logger.info(f"Request successful with branch file status code: {items_response.status_code}")
-            items = items_response.json()['value']
-            if exclude_paths:
-                items = [item for item in items if not any(item['path'].startswith(excluded_path) for excluded_path in exclude_paths)]
-            return len([item for item in items if determine_file_type(item) in ['File', 'Folder']])
-        else:
-            logger.error(f"Failed to retrieve items for branch file'{branch_path}'. Status code: {items_response.status_code}")
-            return 0
+        return sum(1 for item in iter_branch_items(devops_server_url, project_name, branch_path, pat, exclude_paths)
+                   if determine_file_type(item) in ['File', 'Folder'])
     except Exception as e:
-        logger.error(f"Failed to retrieve items for branch file: {e}")
+        logger.error(f"Failed to retrieve items for branch file'{branch_path}': {e}")
         return 0
 
 
 def get_branch_file_details(devops_server_url, project_name, branch_path, pat, excluded_paths=[]):
-    try: 
-        items_api_url = f'{devops_server_url}/{project_name}/_apis/tfvc/items?scopePath={branch_path}&recursionLevel=full&api-version=6.0'
-        items_response = make_request_with_retries(items_api_url, auth=HTTPBasicAuth('', pat))
-        if items_response.status_code == 200:
-            logger.info(f"Request successful with branch status code: {items_response.status_code}")
-            items = items_response.json()['value']
-            return [item for item in items if not any(item['path'].startswith(excluded_path) for excluded_path in excluded_paths)]
-        else:
-            logger.error(f"Failed to retrieve items for branch '{branch_path}'. Status code: {items_response.status_code}")
-            return []
+    try:
+        return list(iter_branch_items(devops_server_url, project_name, branch_path, pat, excluded_paths))
     except Exception as e:
-        logger.error(f"Failed to retrieve items for branch: {e}")
+        logger.error(f"Failed to retrieve items for branch '{branch_path}': {e}")
         return []
 
 
 def get_latest_changeset_for_item(server_url, project_name, item_path, pat):
     try: 
         changesets_url = f"{server_url}/{project_name}/_apis/tfvc/changesets?itemPath={item_path}&api-version=6.0"
-        response = make_request_with_retries(changesets_url, auth=HTTPBasicAuth('', pat))
+        response = make_request_with_retries(changesets_url, pat)
         if response.status_code == 200:
             logger.info(f"Request successful with changeset status code: {response.status_code}")
             changesets = response.json().get('value', [])
@@ -252,7 +256,7 @@ def generate_excel_report(output_dir, server_url, pat, project, start_time):
         }
 
         tfvc_check_api_url = f'{server_url}/{project_name}/_apis/tfvc/branches?api-version=6.0'
-        tfvc_response = make_request_with_retries(tfvc_check_api_url, auth=HTTPBasicAuth('', pat))
+        tfvc_response = make_request_with_retries(tfvc_check_api_url, pat)
         if tfvc_response.status_code == 200:
             try:
                 tfvc_branches = tfvc_response.json()['value']
@@ -292,7 +296,7 @@ def generate_excel_report(output_dir, server_url, pat, project, start_time):
             logger.error(f"  Failed to retrieve TFVC branches for project '{project_name}'. Status code: {tfvc_response.status_code}")
 
         # Fetch all changesets
-        changeset_response = make_request_with_retries(tfvc_changesets_url, auth=HTTPBasicAuth('', pat))
+        changeset_response = make_request_with_retries(tfvc_changesets_url, pat)
         if changeset_response.status_code == 200:
             logger.info(f"Changeset status code -{changeset_response.status_code}")
             changesets = changeset_response.json()['value']
@@ -393,24 +397,28 @@ def generate_excel_report(output_dir, server_url, pat, project, start_time):
             all_files_data_df = []
             for branch_name, branch_file_details in all_branch_file_details.items():
                 branch_file_data = []
-                for item in branch_file_details:
-                    if item['path'] != f'$/{project_name}':
-                        changeset_id, comment, last_modified, author = get_latest_changeset_for_item(
-                            server_url, project_name, item['path'], pat)
-                        item_data = {
-                            'Root Folder': project_name,
-                            'Project Folder': '/'.join(item['path'].split('/')[2:-1]),
-                            'File Name': item['path'].rsplit('/', 1)[-1],
-                            'File Type': determine_file_type(item),
-                            'File Size (bytes)': item.get('size', 'N/A'),
-                            'File Path': item['path'],
-                            'Last modified (time&date)': last_modified,
-                            'Author': author,
-                            'Comment': comment,
-                            'Changeset ID': changeset_id
-                        }
-                        branch_file_data.append(item_data)
-                        all_files_data_df.append(item_data)
+                branch_items = [item for item in branch_file_details if item['path'] != f'$/{project_name}']
+                # Resolve the latest changeset of every item concurrently
+                latest_changesets = async_engine.fan_out(
+                    server_url,
+                    lambda item: get_latest_changeset_for_item(server_url, project_name, item['path'], pat),
+                    branch_items)
+                for item, latest_changeset in zip(branch_items, latest_changesets):
+                    changeset_id, comment, last_modified, author = latest_changeset or (None, 'No comment', 'N/A', 'N/A')
+                    item_data = {
+                        'Root Folder': project_name,
+                        'Project Folder': '/'.join(item['path'].split('/')[2:-1]),
+                        'File Name': item['path'].rsplit('/', 1)[-1],
+                        'File Type': determine_file_type(item),
+                        'File Size (bytes)': item.get('size', 'N/A'),
+                        'File Path': item['path'],
+                        'Last modified (time&date)': last_modified,
+                        'Author': author,
+                        'Comment': comment,
+                        'Changeset ID': changeset_id
+                    }
+                    branch_file_data.append(item_data)
+                    all_files_data_df.append(item_data)
 
                 branch_df = pd.DataFrame(branch_file_data)
                 branch_df = branch_df[['Root Folder', 'Project Folder', 'File Name', 'File Type', 'File Size (bytes)',
@@ -502,6 +510,29 @@ def generate_excel_report(output_dir, server_url, pat, project, start_time):
                     else:
                         all_shelvesets_worksheet.write(row_num, col_num, value, regular_format)
 
+            performance_df = pd.DataFrame(metrics.snapshot(), columns=metrics.PERFORMANCE_COLUMNS)
+            performance_df.to_excel(writer, sheet_name='Performance', index=False)
+
+            # Apply the header format to the Performance sheet
+            performance_worksheet = writer.sheets['Performance']
+            performance_worksheet.hide_gridlines(2)  # Remove gridlines in the Performance sheet
+            for col_num, value in enumerate(performance_df.columns.values):
+                performance_worksheet.write(0, col_num, value, header_format)
+
+            # Set column widths to fit data in Performance sheet
+            set_column_widths(performance_worksheet, performance_df)
+
+            # Add borders and right-align numerical cells in the Performance sheet
+            for row_num in range(1, len(performance_df) + 1):
+                for col_num, value in enumerate(performance_df.iloc[row_num - 1]):
+                    if pd.isna(value):
+                        performance_worksheet.write_blank(row_num, col_num, None, regular_format)
+                    elif isinstance(value, (int, float)):
+                        performance_worksheet.write(row_num, col_num, value, right_align_format)
+                    else:
+                        performance_worksheet.write(row_num, col_num, value, regular_format)
+
+        metrics.write_json(metrics.sidecar_path(excel_output_path))
         logger.info(f"Report saved to {excel_output_path}")
     except Exception as e:
         logger.error(f"Failed to generate Excel report for project '{project}': {e}")
@@ -512,6 +543,8 @@ def main():
     try:
         run_id = str(int(datetime.now().strftime("%Y%m%d%H%M%S")))
         output_directory = os.path.join("TFVC", run_id)
+        # Changesets and their change lists never change, so reruns read them from the response cache
+        response_cache.enable()
 
         # Create output directory if it doesn't exist
         if not os.path.exists(output_directory):
@@ -523,6 +556,8 @@ def main():
         df['Server URL'] = df['Server URL'].str.strip().fillna('')
         df['Project Name'] = df['Project Name'].str.strip().fillna('')
         df['PAT'] = df['PAT'].str.strip().fillna('')
+        apply_concurrency_settings(df)
+        apply_token_pools(df)
 
         # Form the input data in below format
         # Sample: { "server_url": { "pat": "123test_token", "projects": ['dev_server', 'qa_server'] }
@@ -533,7 +568,7 @@ def main():
                 continue
             surl = row['Server URL']
             proj_name = row['Project Name']
-            ptoken = row['PAT']
+            ptoken = primary_pat(row['PAT'])
             proj_names = []
             if not proj_name:
                 proj_names = get_project_names(devops_server_url=surl, pat=ptoken)
@@ -555,6 +590,7 @@ def main():
                 try:
                     # Generate the Excel report
                     generate_excel_report(output_directory, server_url, pat, project, start_time)
+                    metrics.reset()
                 except Exception as e:
                     logger.error(f"Error occurred while processing project '{project}': {e}")
     except Exception as e:
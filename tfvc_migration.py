@@ -1,11 +1,13 @@
 import os
-import requests
 import base64
 import tempfile
 import urllib.parse
 import shutil
 import json
 import pandas as pd
+from utils import http_client
+from utils.common import apply_token_pools
+from utils.token_pool import primary_pat
 
 # Load the Excel file
 file_path = 'migration_input_form.xlsx'  # Assuming the file is in the same directory as the script
@@ -27,11 +29,15 @@ print("Target Data:", target_df.iloc[0])
 # Read configuration from the Excel file
 source_collection_url = source_df['Source Server URL'].iloc[0]
 source_project_name = source_df['Source Project Name'].iloc[0]
-source_pat = source_df['PAT'].iloc[0]
+source_pat = primary_pat(source_df['PAT'].iloc[0])
 
 target_collection_url = target_df['Target Organization URL'].iloc[0]
 target_project_name = target_df['Target Project Name'].iloc[0]
-target_pat = target_df['PAT'].iloc[0]
+target_pat = primary_pat(target_df['PAT'].iloc[0])
+
+# Several PATs in a PAT cell form a pool that requests are spread across
+apply_token_pools(source_df, url_column='Source Server URL')
+apply_token_pools(target_df, url_column='Target Organization URL')
 
 # Print PAT values for debugging
 print("Source PAT:", source_pat)
@@ -40,25 +46,19 @@ print("Target PAT:", target_pat)
 source_tfvc_path = f'$/{source_project_name}'.strip()
 target_tfvc_path = f'$/{target_project_name}'.strip()
 
-def get_basic_auth_header(pat):
-    return 'Basic ' + base64.b64encode(f':{pat}'.encode()).decode()
-
 def get_changesets(source_collection_url, source_pat):
     url = f"{source_collection_url}/_apis/tfvc/changesets?api-version=6.0"
-    headers = {'Authorization': get_basic_auth_header(source_pat)}
-    response = requests.get(url, headers=headers)
+    response = http_client.get(url, source_pat)
     response.raise_for_status()
     return response.json()['value']
 
 def get_changeset_changes(source_collection_url, changeset_id, source_pat):
     url = f"{source_collection_url}/_apis/tfvc/changesets/{changeset_id}/changes?api-version=6.0"
-    headers = {'Authorization': get_basic_auth_header(source_pat)}
-    response = requests.get(url, headers=headers)
+    response = http_client.get(url, source_pat)
     response.raise_for_status()
     return response.json()['value']
 
 def download_changeset_files(source_collection_url, changeset_id, changes, source_pat, temp_dir, deleted_files):
-    headers = {'Authorization': get_basic_auth_header(source_pat)}
     for change in changes:
         item_path = change['item']['path']
         # Check if the file belongs to the specified source project
@@ -74,7 +74,7 @@ def download_changeset_files(source_collection_url, changeset_id, changes, sourc
         encoded_path = urllib.parse.quote(item_path)
         item_url = f"{source_collection_url}/_apis/tfvc/items?path={encoded_path}&versionDescriptor.version={changeset_id}&api-version=6.0"
         print(f"Attempting to download: {item_url}")
-        response = requests.get(item_url, headers=headers)
+        response = http_client.get(item_url, source_pat)
         if response.status_code == 404:
             print(f"File not found: {item_path} (URL: {item_url})")
             continue
@@ -95,7 +95,6 @@ def download_changeset_files(source_collection_url, changeset_id, changes, sourc
 def create_changeset(target_collection_url, target_pat, changes, comment):
     url = f"{target_collection_url}/_apis/tfvc/changesets?api-version=7.1-preview.3"
     headers = {
-        'Authorization': get_basic_auth_header(target_pat),
         'Content-Type': 'application/json'
     }
 
@@ -107,7 +106,7 @@ def create_changeset(target_collection_url, target_pat, changes, comment):
     print("Creating changeset with data:")
     print(json.dumps(data, indent=2))  # Debug print to check changes data
 
-    response = requests.post(url, headers=headers, data=json.dumps(data))
+    response = http_client.post(url, target_pat, headers=headers, data=json.dumps(data))
     if response.status_code >= 400:
         print(f"Failed to create changeset. Status Code: {response.status_code}")
         print(f"Response: {response.text}")
@@ -118,8 +117,7 @@ def create_changeset(target_collection_url, target_pat, changes, comment):
 
 def file_exists_in_tfvc(target_collection_url, target_pat, path):
     url = f"{target_collection_url}/_apis/tfvc/items?path={urllib.parse.quote(path)}&api-version=6.0"
-    headers = {'Authorization': get_basic_auth_header(target_pat)}
-    response = requests.get(url, headers=headers)
+    response = http_client.get(url, target_pat)
     return response.status_code == 200
 
 def upload_changeset_files(target_collection_url, target_pat, temp_dir, target_tfvc_path, deleted_files):
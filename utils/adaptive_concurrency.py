@@ -0,0 +1,109 @@
+import logging
+import threading
+import time
+from collections import deque
+
+logger = logging.getLogger(__name__)
+
+# AIMD tuning: start low, add one slot per window of healthy completions, halve on trouble
+INITIAL_LIMIT = 2
+DECREASE_FACTOR = 0.5
+# Minimum seconds between two decreases, so one burst of failures only halves the limit once
+DECREASE_COOLDOWN = 2.0
+LATENCY_WINDOW = 50
+MIN_SAMPLES = 10
+# A window p95 this many times above the healthy baseline counts as overload
+LATENCY_TOLERANCE = 2.0
+OVERLOAD_STATUSES = {429, 500, 502, 503, 504}
+
+
+class AdaptiveLimit:
+    """Additive-increase / multiplicative-decrease in-flight limit for one server URL."""
+
+    def __init__(self, server_url, max_limit):
+        self.server_url = server_url
+        self.max_limit = max_limit
+        self.limit = float(min(INITIAL_LIMIT, max_limit))
+        self.latencies = deque(maxlen=LATENCY_WINDOW)
+        self.baseline_p95 = None
+        self.last_decrease = 0.0
+        self.lock = threading.Lock()
+
+    def current(self):
+        with self.lock:
+            return max(1, int(self.limit))
+
+    def _window_p95(self):
+        ordered = sorted(self.latencies)
+        return ordered[int(0.95 * (len(ordered) - 1))]
+
+    def _decrease(self, reason):
+        now = time.monotonic()
+        if now - self.last_decrease < DECREASE_COOLDOWN:
+            return
+        self.last_decrease = now
+        previous = self.limit
+        self.limit = max(1.0, self.limit * DECREASE_FACTOR)
+        logger.warning(f"Concurrency for {self.server_url} cut from {int(previous)} to {int(self.limit)} ({reason})")
+
+    def on_success(self, latency):
+        with self.lock:
+            self.latencies.append(latency)
+            if len(self.latencies) >= MIN_SAMPLES:
+                p95 = self._window_p95()
+                if self.baseline_p95 is None:
+                    self.baseline_p95 = p95
+                elif p95 > self.baseline_p95 * LATENCY_TOLERANCE:
+                    self._decrease(f"p95 {p95:.2f}s above baseline {self.baseline_p95:.2f}s")
+                    self.latencies.clear()
+                    return
+                else:
+                    self.baseline_p95 = self.baseline_p95 * 0.95 + p95 * 0.05
+            # One extra slot after roughly `limit` healthy completions
+            self.limit = min(float(self.max_limit), self.limit + 1 / self.limit)
+
+    def on_failure(self, reason):
+        with self.lock:
+            self._decrease(reason)
+
+
+_limits = {}
+_limits_lock = threading.Lock()
+
+
+def register(server_url, max_limit):
+    """Track a server URL; its limit adapts between 1 and max_limit."""
+    key = server_url.rstrip('/').lower()
+    with _limits_lock:
+        limit = _limits.get(key)
+        if limit is None:
+            _limits[key] = AdaptiveLimit(server_url.rstrip('/'), max_limit)
+        else:
+            limit.max_limit = max_limit
+            limit.limit = min(limit.limit, float(max_limit))
+
+
+def _match(url):
+    """AdaptiveLimit of the longest registered server URL that url starts with."""
+    lowered = url.lower()
+    with _limits_lock:
+        matches = [key for key in _limits if lowered == key or lowered.startswith(key + '/')]
+        return _limits[max(matches, key=len)] if matches else None
+
+
+def current_limit(server_url):
+    limit = _match(server_url.rstrip('/'))
+    return limit.current() if limit else INITIAL_LIMIT
+
+
+def observe(url, elapsed, status_code=None, timed_out=False):
+    """Feed the outcome of one request to the limit of the server it was sent to."""
+    limit = _match(url)
+    if limit is None:
+        return
+    if timed_out:
+        limit.on_failure("request timed out")
+    elif status_code in OVERLOAD_STATUSES:
+        limit.on_failure(f"status {status_code}")
+    else:
+        limit.on_success(elapsed)
@@ -0,0 +1,85 @@
+import asyncio
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from utils import adaptive_concurrency, deadlines
+
+logger = logging.getLogger(__name__)
+
+# Upper bound on in-flight requests for servers without an explicit setting
+DEFAULT_CONCURRENCY = 8
+
+_limits = {}
+_limits_lock = threading.Lock()
+
+
+def set_concurrency(server_url, limit):
+    """Cap the number of in-flight requests issued against a server URL."""
+    with _limits_lock:
+        _limits[server_url.rstrip('/')] = max(1, int(limit))
+
+
+def get_concurrency(server_url):
+    with _limits_lock:
+        return _limits.get(server_url.rstrip('/'), DEFAULT_CONCURRENCY)
+
+
+class _AdaptiveGate:
+    """Admits calls while fewer than the server's current adaptive limit are in flight."""
+
+    def __init__(self, server_url):
+        self.server_url = server_url
+        self.in_flight = 0
+        self.condition = asyncio.Condition()
+
+    async def __aenter__(self):
+        async with self.condition:
+            await self.condition.wait_for(
+                lambda: self.in_flight < adaptive_concurrency.current_limit(self.server_url))
+            self.in_flight += 1
+
+    async def __aexit__(self, exc_type, exc, tb):
+        async with self.condition:
+            self.in_flight -= 1
+            self.condition.notify_all()
+
+
+def _call_within(deadline, func, item):
+    with deadlines.bind(deadline):
+        return func(item)
+
+
+async def _run_bounded(gate, executor, func, item, deadline):
+    async with gate:
+        loop = asyncio.get_running_loop()
+        try:
+            return await loop.run_in_executor(executor, _call_within, deadline, func, item)
+        except Exception as e:
+            logger.error(f"Concurrent request failed for item {item}: {e}")
+            return None
+
+
+async def _fan_out(server_url, func, items, deadline):
+    limit = get_concurrency(server_url)
+    adaptive_concurrency.register(server_url, limit)
+    gate = _AdaptiveGate(server_url)
+    # Blocking calls go through the shared pooled client; the configured cap bounds the worker threads
+    # and the adaptive limit decides how many of them are busy at any time
+    with ThreadPoolExecutor(max_workers=limit) as executor:
+        tasks = [_run_bounded(gate, executor, func, item, deadline) for item in items]
+        return await asyncio.gather(*tasks)
+
+
+def fan_out(server_url, func, items):
+    """Run func(item) for every item, adapting the number in flight to the server's health.
+
+    The in-flight count grows additively while latency and errors stay healthy and is halved on
+    timeouts, 5xx/429 responses or a rising p95, never exceeding the server's configured cap.
+
+    Results are returned in the same order as items; an item whose call raised yields None.
+    The caller's deadline (see utils.deadlines) also applies inside the worker threads.
+    """
+    items = list(items)
+    if not items:
+        return []
+    return asyncio.run(_fan_out(server_url, func, items, deadlines.current()))
@@ -0,0 +1,53 @@
+import logging
+import os
+import threading
+from utils import sqlite_store
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_INDEX_PATH = os.path.join('.cache', 'blob_sizes.sqlite')
+
+
+class BlobSizeIndex:
+    """Persistent SHA1 -> size index of Git blobs.
+
+    Blobs are content-addressed, so an entry is valid for every branch, repository and run and is never invalidated.
+    """
+
+    def __init__(self, path=DEFAULT_INDEX_PATH):
+        self.lock = threading.Lock()
+        self.connection = sqlite_store.connect(path)
+        self.connection.execute(
+            'CREATE TABLE IF NOT EXISTS blob_sizes (sha1 TEXT PRIMARY KEY, size INTEGER) WITHOUT ROWID')
+        self.connection.commit()
+
+    def get_many(self, sha1_list):
+        """{sha1: size} for the SHA1s already in the index."""
+        with self.lock:
+            return dict(sqlite_store.select_in(
+                self.connection, 'SELECT sha1, size FROM blob_sizes WHERE sha1 IN ({placeholders})', sha1_list))
+
+    def put_many(self, sizes):
+        if not sizes:
+            return
+        with self.lock:
+            self.connection.executemany('INSERT OR IGNORE INTO blob_sizes VALUES (?, ?)', sizes.items())
+            self.connection.commit()
+
+    def close(self):
+        with self.lock:
+            self.connection.close()
+
+
+_index = None
+_index_lock = threading.Lock()
+
+
+def get_index(path=DEFAULT_INDEX_PATH):
+    """The shared index, opened on first use."""
+    global _index
+    with _index_lock:
+        if _index is None:
+            _index = BlobSizeIndex(path)
+            logger.info(f"Blob size index opened at {path}")
+        return _index
@@ -0,0 +1,85 @@
+class CommitStore:
+    """Commits of one repository keyed by commit ID, each held once however many branches contain it.
+
+    Branch membership is derived by walking parent links from a branch head, so a branch whose history
+    is already in the store costs no further commit traffic.
+    """
+
+    def __init__(self):
+        self.commits = {}
+        # Insertion position of each commit; listings arrive newest first, so it breaks date ties
+        self.order = {}
+        # Commits whose whole ancestry is in the store
+        self.complete = set()
+
+    def __contains__(self, commit_id):
+        return commit_id in self.commits
+
+    def __len__(self):
+        return len(self.commits)
+
+    def get(self, commit_id):
+        return self.commits.get(commit_id)
+
+    def add(self, commit):
+        """Store a REST-shaped commit dict that carries its 'parents' list."""
+        if commit['commitId'] not in self.commits:
+            self.order[commit['commitId']] = len(self.order)
+            self.commits[commit['commitId']] = commit
+
+    def is_complete(self, commit_id):
+        return commit_id in self.complete
+
+    def walk(self, head):
+        """Commits reachable from head through stored parent links, newest first; marks them complete if none is missing."""
+        reachable = []
+        seen = set()
+        missing = False
+        stack = [head]
+        while stack:
+            commit_id = stack.pop()
+            if commit_id in seen:
+                continue
+            seen.add(commit_id)
+            commit = self.commits.get(commit_id)
+            if commit is None:
+                missing = True
+                continue
+            reachable.append(commit)
+            stack.extend(commit.get('parents', []))
+        if not missing:
+            self.complete.update(commit['commitId'] for commit in reachable)
+        reachable.sort(key=lambda commit: self.order[commit['commitId']])
+        return sorted(reachable, key=lambda commit: commit['author']['date'], reverse=True)
+
+    def frontier(self, head):
+        """Tracker of the commits reachable from head that are not in the store yet."""
+        return Frontier(self, head)
+
+
+class Frontier:
+    """Unknown commits still reachable from a branch head while that branch's history is being listed."""
+
+    def __init__(self, store, head):
+        self.store = store
+        self.pending = {head}
+        self.expanded = set()
+        self.advance()
+
+    def advance(self):
+        """Follow parent links through commits that have reached the store since the last call."""
+        stack = list(self.pending)
+        self.pending = set()
+        while stack:
+            commit_id = stack.pop()
+            if commit_id in self.expanded or self.store.is_complete(commit_id):
+                continue
+            commit = self.store.get(commit_id)
+            if commit is None:
+                self.pending.add(commit_id)
+                continue
+            self.expanded.add(commit_id)
+            stack.extend(commit.get('parents', []))
+
+    def __bool__(self):
+        return bool(self.pending)
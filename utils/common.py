@@ -1,12 +1,12 @@
-import requests
-from requests.auth import HTTPBasicAuth
+import pandas as pd
+from utils import http_client, async_engine, token_pool
 
 
 def get_project_names(devops_server_url, pat):
     project_names = []
 
     projects_api_url = f'{devops_server_url}/_apis/projects?api-version=6.0'
-    response = requests.get(projects_api_url, auth=HTTPBasicAuth('', pat))
+    response = http_client.get(projects_api_url, pat)
 
     if response.status_code == 200:
         try:
@@ -26,7 +26,7 @@ def get_repo_names_by_project(devops_server_url, pat, project_name):
     repo_names = []
 
     repos_api_url = f'{devops_server_url}/{project_name}/_apis/git/repositories?api-version=6.0'
-    repo_response = requests.get(repos_api_url, auth=HTTPBasicAuth('', pat))
+    repo_response = http_client.get(repos_api_url, pat)
 
     if repo_response.status_code == 200:
         try:
@@ -44,6 +44,36 @@ def get_repo_names_by_project(devops_server_url, pat, project_name):
     return repo_names
 
 
+def apply_concurrency_settings(df, url_column='Server URL'):
+    """Apply the optional 'Concurrency' column of an input form as per-server request caps."""
+    if 'Concurrency' not in df.columns:
+        return
+    for _, row in df.iterrows():
+        server_url = row[url_column]
+        concurrency = row['Concurrency']
+        if pd.isna(server_url) or not str(server_url).strip() or pd.isna(concurrency):
+            continue
+        async_engine.set_concurrency(str(server_url).strip(), int(concurrency))
+
+
+def apply_token_pools(df, url_column='Server URL', pat_column='PAT'):
+    """Register the PATs given for each server (several per cell or over several rows) as a token pool.
+
+    The optional 'PAT Strategy' column picks 'least-throttled' (default) or 'round-robin'.
+    """
+    pools = {}
+    for _, row in df.iterrows():
+        server_url = row[url_column]
+        if pd.isna(server_url) or not str(server_url).strip() or pd.isna(row[pat_column]):
+            continue
+        pool = pools.setdefault(str(server_url).strip().rstrip('/'), {'pats': [], 'strategy': None})
+        pool['pats'].extend(token_pool.split_pats(str(row[pat_column])))
+        if 'PAT Strategy' in df.columns and not pd.isna(row['PAT Strategy']) and str(row['PAT Strategy']).strip():
+            pool['strategy'] = str(row['PAT Strategy']).strip().lower()
+    for server_url, pool in pools.items():
+        token_pool.register(server_url, pool['pats'], pool['strategy'] or token_pool.DEFAULT_STRATEGY)
+
+
 def add_if_not_exists(lst, values):
     for value in values:
         if value.lower() not in map(str.lower, lst):
@@ -0,0 +1,120 @@
+import logging
+import threading
+import time
+from contextlib import contextmanager
+import requests
+from urllib3.exceptions import MaxRetryError, ResponseError
+from urllib3.util.retry import Retry
+
+logger = logging.getLogger(__name__)
+
+# Retries may use at most this share of first attempts, plus a small reserve for the start of a run
+RETRY_BUDGET_RATIO = 0.2
+RETRY_BUDGET_RESERVE = 50
+RETRY_BUDGET_MAX = 500
+
+
+class DeadlineExceeded(requests.exceptions.Timeout):
+    """Raised when a request would start after its request or phase deadline has passed."""
+
+
+_local = threading.local()
+
+
+def current():
+    """The (name, monotonic expiry) deadline bound to this thread, or None."""
+    return getattr(_local, 'deadline', None)
+
+
+@contextmanager
+def bind(deadline):
+    """Make a deadline captured on another thread apply to this one, e.g. inside worker threads."""
+    previous = current()
+    _local.deadline = deadline
+    try:
+        yield
+    finally:
+        _local.deadline = previous
+
+
+@contextmanager
+def phase(name, seconds):
+    """Bound every request sent on this thread inside the block to `seconds` from now.
+
+    Nested phases never extend an outer deadline.
+    """
+    if seconds is None:
+        yield
+        return
+    expiry = time.monotonic() + seconds
+    outer = current()
+    if outer and outer[1] < expiry:
+        name, expiry = outer
+    with bind((name, expiry)):
+        yield
+
+
+def remaining():
+    deadline = current()
+    return deadline[1] - time.monotonic() if deadline else None
+
+
+def check(url):
+    deadline = current()
+    if deadline and time.monotonic() >= deadline[1]:
+        raise DeadlineExceeded(f"Deadline of phase '{deadline[0]}' exceeded before requesting {url}")
+
+
+def clamp_timeout(timeout):
+    """Shorten a request timeout so it cannot run past the current deadline."""
+    left = remaining()
+    if left is None:
+        return timeout
+    return max(0.001, min(timeout, left)) if timeout is not None else max(0.001, left)
+
+
+class RetryBudget:
+    """Run-wide token budget so retries stay a bounded fraction of the traffic."""
+
+    def __init__(self, ratio=RETRY_BUDGET_RATIO, reserve=RETRY_BUDGET_RESERVE, maximum=RETRY_BUDGET_MAX):
+        self.ratio = ratio
+        self.maximum = maximum
+        self.tokens = float(reserve)
+        self.lock = threading.Lock()
+
+    def deposit(self):
+        with self.lock:
+            self.tokens = min(self.maximum, self.tokens + self.ratio)
+
+    def can_spend(self):
+        with self.lock:
+            return self.tokens >= 1
+
+    def try_spend(self):
+        with self.lock:
+            if self.tokens < 1:
+                return False
+            self.tokens -= 1
+            return True
+
+
+retry_budget = RetryBudget()
+
+
+class BudgetedRetry(Retry):
+    """urllib3 Retry that stops retrying once the global retry budget or the current deadline runs out."""
+
+    def _may_retry(self):
+        left = remaining()
+        return retry_budget.can_spend() and (left is None or left > 0)
+
+    def is_retry(self, method, status_code, has_retry_after=False):
+        if not self._may_retry():
+            return False
+        return super().is_retry(method, status_code, has_retry_after)
+
+    def increment(self, method=None, url=None, response=None, error=None, _pool=None, _stacktrace=None):
+        if not self._may_retry() or not retry_budget.try_spend():
+            logger.warning(f"Retry budget or deadline exhausted; not retrying {url}")
+            raise MaxRetryError(_pool, url, error or ResponseError('retry budget or deadline exhausted'))
+        return super().increment(method, url, response, error, _pool, _stacktrace)
@@ -0,0 +1,117 @@
+import json
+import logging
+import os
+import threading
+import time
+import zlib
+from utils import sqlite_store
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_STATE_PATH = os.path.join('.cache', 'git_discovery_state.sqlite')
+
+
+class DiscoveryState:
+    """High-water marks of earlier discovery runs: the head commit and tree ID last seen per branch, with
+    the data needed to reuse the branch unchanged or to extend it, plus each repository's known commits.
+
+    Git objects (annotated tags, commits) are also kept by object ID; they never change, so they are served
+    even when earlier runs are otherwise ignored.
+    """
+
+    def __init__(self, run_id, path=DEFAULT_STATE_PATH, reuse=True):
+        self.run_id = run_id
+        # Without reuse, previous runs are ignored but this run's state is still recorded
+        self.reuse = reuse
+        self.lock = threading.Lock()
+        self.connection = sqlite_store.connect(path)
+        self.connection.execute(
+            'CREATE TABLE IF NOT EXISTS branch_state ('
+            'key TEXT PRIMARY KEY, head TEXT, tree TEXT, run_id TEXT, data BLOB, updated REAL)')
+        self.connection.execute(
+            'CREATE TABLE IF NOT EXISTS repo_commits (key TEXT PRIMARY KEY, data BLOB, updated REAL)')
+        self.connection.execute(
+            'CREATE TABLE IF NOT EXISTS objects (object_id TEXT PRIMARY KEY, data BLOB) WITHOUT ROWID')
+        self.connection.commit()
+
+    @staticmethod
+    def _key(server_url, *names):
+        return json.dumps([server_url.rstrip('/').lower(), *names])
+
+    @staticmethod
+    def _pack(data):
+        return zlib.compress(json.dumps(data).encode())
+
+    @staticmethod
+    def _unpack(blob):
+        return json.loads(zlib.decompress(blob).decode())
+
+    def load_branch(self, server_url, project, repository, branch):
+        """{'head', 'tree', 'run_id', ...saved data} of the branch's last recorded run, or None."""
+        if not self.reuse:
+            return None
+        with self.lock:
+            row = self.connection.execute('SELECT head, tree, run_id, data FROM branch_state WHERE key = ?',
+                                          (self._key(server_url, project, repository, branch),)).fetchone()
+        if row is None:
+            return None
+        head, tree, run_id, data = row
+        return {'head': head, 'tree': tree, 'run_id': run_id, **self._unpack(data)}
+
+    def save_branch(self, server_url, project, repository, branch, head, tree, data):
+        with self.lock:
+            self.connection.execute(
+                'INSERT OR REPLACE INTO branch_state VALUES (?, ?, ?, ?, ?, ?)',
+                (self._key(server_url, project, repository, branch), head, tree, self.run_id, self._pack(data),
+                 time.time()))
+            self.connection.commit()
+
+    def load_commits(self, server_url, project, repository):
+        """Commits (with parents) recorded for the repository by earlier runs."""
+        if not self.reuse:
+            return []
+        with self.lock:
+            row = self.connection.execute('SELECT data FROM repo_commits WHERE key = ?',
+                                          (self._key(server_url, project, repository),)).fetchone()
+        return self._unpack(row[0]) if row else []
+
+    def save_commits(self, server_url, project, repository, commits):
+        with self.lock:
+            self.connection.execute('INSERT OR REPLACE INTO repo_commits VALUES (?, ?, ?)',
+                                    (self._key(server_url, project, repository), self._pack(commits), time.time()))
+            self.connection.commit()
+
+    def get_objects(self, object_ids):
+        """{object ID: data} for the object IDs already recorded."""
+        with self.lock:
+            rows = sqlite_store.select_in(
+                self.connection, 'SELECT object_id, data FROM objects WHERE object_id IN ({placeholders})', object_ids)
+        return {object_id: self._unpack(data) for object_id, data in rows}
+
+    def put_objects(self, objects):
+        if not objects:
+            return
+        with self.lock:
+            self.connection.executemany('INSERT OR IGNORE INTO objects VALUES (?, ?)',
+                                        [(object_id, self._pack(data)) for object_id, data in objects.items()])
+            self.connection.commit()
+
+    def close(self):
+        with self.lock:
+            self.connection.close()
+
+
+_state = None
+
+
+def enable(run_id, path=DEFAULT_STATE_PATH, reuse=True):
+    """Record this run's high-water marks and, with reuse, build on those of earlier runs."""
+    global _state
+    if _state is None:
+        _state = DiscoveryState(run_id, path, reuse)
+        logger.info(f"Incremental discovery state at {path} ({'reusing earlier runs' if reuse else 'full run'})")
+    return _state
+
+
+def get_state():
+    return _state
@@ -0,0 +1,65 @@
+FOLDER_COLUMNS = ['Collection Name', 'Project Name', 'Repository Name', 'Branch Name', 'Path', 'Depth', 'File Count',
+                  'Total Size (Bytes)', 'Total Size (MB)', 'Largest File (Bytes)', 'Largest File']
+# Folder levels below the root listed in the folders sheet
+DEFAULT_FOLDER_DEPTH = 3
+
+
+class _Folder:
+    __slots__ = ('children', 'files', 'size', 'largest', 'largest_path')
+
+    def __init__(self):
+        self.children = {}
+        self.files = 0
+        self.size = 0
+        self.largest = 0
+        self.largest_path = ''
+
+
+class FolderRollup:
+    """Prefix tree of a branch's folders holding the file count, total bytes and largest file below each one.
+
+    Every file is added once and counted into each of its ancestor folders on the way down, so the totals of
+    all folders come from a single pass over the item listing.
+    """
+
+    def __init__(self):
+        self.root = _Folder()
+
+    def add_file(self, path, size):
+        size = int(size or 0)
+        folder = self.root
+        names = [name for name in path.split('/') if name]
+        for name in [None] + names[:-1]:
+            if name is not None:
+                folder = folder.children.setdefault(name, _Folder())
+            folder.files += 1
+            folder.size += size
+            if size > folder.largest or not folder.largest_path:
+                folder.largest, folder.largest_path = size, path
+
+    def folders(self, depth=DEFAULT_FOLDER_DEPTH):
+        """(path, depth, folder) of the folders at most depth levels below the root ('/' is depth 0), parents first."""
+        stack = [('/', 0, self.root)]
+        while stack:
+            path, level, folder = stack.pop()
+            yield path, level, folder
+            if depth is None or level < depth:
+                for name in sorted(folder.children, reverse=True):
+                    stack.append((f"{path.rstrip('/')}/{name}", level + 1, folder.children[name]))
+
+    def rows(self, server_url, project, repository_name, branch, depth=DEFAULT_FOLDER_DEPTH):
+        """Rows of the folders sheet for this branch."""
+        for path, level, folder in self.folders(depth):
+            yield {
+                'Collection Name': server_url.split('/')[-1],
+                'Project Name': project,
+                'Repository Name': repository_name,
+                'Branch Name': branch,
+                'Path': path,
+                'Depth': level,
+                'File Count': folder.files,
+                'Total Size (Bytes)': folder.size,
+                'Total Size (MB)': round(folder.size / (1024 * 1024), 2),
+                'Largest File (Bytes)': folder.largest,
+                'Largest File': folder.largest_path
+            }
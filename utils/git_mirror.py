@@ -0,0 +1,182 @@
+import base64
+import logging
+import os
+import re
+import subprocess
+import threading
+from urllib.parse import urlsplit, unquote
+
+logger = logging.getLogger(__name__)
+
+# Bare mirrors are kept here between runs, so later runs only fetch new objects
+MIRROR_ROOT = os.path.join('.cache', 'git')
+# Dates are rendered like the REST API's author/tagger dates
+DATE_FORMAT = 'format-local:%Y-%m-%dT%H:%M:%SZ'
+CHUNK_SIZE = 64 * 1024
+
+# Field and record separators in git's output (written as %x00/%x01 in formats); neither occurs in names or messages
+FIELD = '\x00'
+RECORD = '\x01'
+
+_synced = set()
+_synced_lock = threading.Lock()
+
+
+class GitError(Exception):
+    """Raised when a git command run against a mirror fails."""
+
+
+def _mirror_path(clone_url, root):
+    parts = urlsplit(clone_url)
+    segments = [re.sub(r'[^\w.-]', '_', unquote(s)) for s in parts.path.split('/') if s and s != '_git']
+    return os.path.join(root, re.sub(r'[^\w.-]', '_', parts.netloc), *segments) + '.git'
+
+
+class GitMirror:
+    """A bare `git clone --mirror` of one repository, queried with git plumbing instead of per-object REST calls."""
+
+    def __init__(self, clone_url, pat, root=MIRROR_ROOT):
+        self.clone_url = clone_url
+        self.pat = pat
+        self.path = _mirror_path(clone_url, root)
+
+    def _env(self):
+        env = dict(os.environ, GIT_TERMINAL_PROMPT='0', TZ='UTC')
+        if self.pat:
+            # The PAT travels as an HTTP header set through the environment, never in argv or the mirror's config
+            token = base64.b64encode(f":{self.pat}".encode()).decode()
+            env.update(GIT_CONFIG_COUNT='1', GIT_CONFIG_KEY_0='http.extraHeader',
+                       GIT_CONFIG_VALUE_0=f"Authorization: Basic {token}")
+        return env
+
+    def _command(self, *args):
+        return ['git', '-c', 'core.quotePath=false', '--git-dir', self.path, *args]
+
+    def _git(self, *args):
+        result = subprocess.run(self._command(*args), stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+                                env=self._env())
+        if result.returncode != 0:
+            raise GitError(f"git {args[0]} failed: {result.stderr.decode(errors='replace').strip()}")
+        return result.stdout.decode('utf-8', errors='replace')
+
+    def _records(self, *args):
+        """Yield the RECORD-separated records of a git command's output as it is produced."""
+        process = subprocess.Popen(self._command(*args), stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+                                   env=self._env())
+        buffer = ''
+        try:
+            for chunk in iter(lambda: process.stdout.read(CHUNK_SIZE), b''):
+                buffer += chunk.decode('utf-8', errors='replace')
+                *records, buffer = buffer.split(RECORD)
+                yield from records
+            if buffer:
+                yield buffer
+        finally:
+            process.stdout.close()
+            stderr = process.stderr.read().decode(errors='replace')
+            process.stderr.close()
+            if process.wait() != 0:
+                raise GitError(f"git {args[0]} failed: {stderr.strip()}")
+
+    def sync(self):
+        """Clone the mirror on first use and fetch it once per run afterwards."""
+        with _synced_lock:
+            if self.path in _synced:
+                return
+            if os.path.isdir(self.path):
+                logger.info(f"Fetching into mirror {self.path}")
+                self._git('fetch', '--prune', '--quiet', 'origin')
+            else:
+                logger.info(f"Cloning {self.clone_url} into mirror {self.path}")
+                os.makedirs(os.path.dirname(self.path), exist_ok=True)
+                result = subprocess.run(['git', 'clone', '--mirror', '--quiet', self.clone_url, self.path],
+                                        stdout=subprocess.PIPE, stderr=subprocess.PIPE, env=self._env())
+                if result.returncode != 0:
+                    raise GitError(f"git clone failed: {result.stderr.decode(errors='replace').strip()}")
+            _synced.add(self.path)
+
+    def branches(self):
+        """{branch name: head commit ID} of refs/heads."""
+        output = self._git('for-each-ref', '--format=%(refname:strip=2)%00%(objectname)', 'refs/heads')
+        return dict(line.split(FIELD) for line in output.splitlines() if line)
+
+    def tags(self):
+        """Tag refs shaped like the REST refs listing, plus tagger details of annotated tags."""
+        fields = ['%(refname)', '%(objectname)', '%(objecttype)', '%(*objectname)', '%(object)', '%(taggername)',
+                  f'%(taggerdate:{DATE_FORMAT})', '%(contents)']
+        output = self._git('for-each-ref', f"--format={'%00'.join(fields)}%01", 'refs/tags')
+        tags = []
+        for record in output.split(RECORD):
+            record = record.lstrip('\n')
+            if not record:
+                continue
+            name, object_id, object_type, peeled, tagged, tagger, date, message = record.split(FIELD)
+            tag = {'name': name, 'objectId': object_id}
+            if object_type == 'tag':
+                tag['peeledObjectId'] = peeled
+                tag['taggedObject'] = {'objectId': tagged}
+                tag['taggedBy'] = {'name': tagger, 'date': date}
+                tag['message'] = message.rstrip('\n')
+            tags.append(tag)
+        return tags
+
+    def branch_stats(self, base):
+        """Branches shaped like the REST stats/branches listing: counts ahead of and behind base, and head commit."""
+        fields = ['%(refname:strip=2)', '%(objectname)', '%(authorname)', f'%(authordate:{DATE_FORMAT})',
+                  f'%(committerdate:{DATE_FORMAT})']
+        output = self._git('for-each-ref', f"--format={'%00'.join(fields)}", 'refs/heads')
+        stats = []
+        for line in output.splitlines():
+            if not line:
+                continue
+            name, object_id, author, authored, committed = line.split(FIELD)
+            # Left counts commits only on base, right those only on the branch
+            behind, ahead = self._git('rev-list', '--left-right', '--count', f'refs/heads/{base}...{object_id}').split()
+            stats.append({'name': name, 'aheadCount': int(ahead), 'behindCount': int(behind), 'isBaseVersion': name == base,
+                          'commit': {'commitId': object_id, 'author': {'name': author, 'date': authored},
+                                     'committer': {'date': committed}}})
+        return stats
+
+    def commits(self, *revisions, no_walk=False):
+        """Yield commits reachable from revisions (newest first) as REST-shaped commit dicts."""
+        options = ['--no-walk=unsorted'] if no_walk else []
+        pretty = '--format=%H%x00%an%x00%ad%x00%B%x01'
+        for record in self._records('log', *options, f'--date={DATE_FORMAT}', pretty, *revisions, '--'):
+            record = record.lstrip('\n')
+            if not record:
+                continue
+            commit_id, author, date, message = record.split(FIELD, 3)
+            yield {'commitId': commit_id, 'comment': message.strip(), 'author': {'name': author, 'date': date}}
+
+    def tree(self, revision):
+        """Every item of a revision's tree, root folder first, shaped like the REST items listing with sizes."""
+        items = [{'path': '/', 'objectId': self._git('rev-parse', f'{revision}^{{tree}}').strip(),
+                  'gitObjectType': 'tree', 'isFolder': True, 'size': 0}]
+        output = self._git('ls-tree', '-r', '-t', '-l', '-z', revision)
+        for entry in output.split('\0'):
+            if not entry:
+                continue
+            meta, path = entry.split('\t', 1)
+            _, object_type, object_id, size = meta.split()
+            items.append({'path': f'/{path}', 'objectId': object_id, 'gitObjectType': object_type,
+                          'isFolder': object_type == 'tree', 'size': int(size) if size.isdigit() else 0})
+        return items
+
+    def commits_with_changes(self, *revisions):
+        """Yield (commit, changed '/'-rooted paths) for every commit reachable from revisions, newest first.
+
+        One `git log --name-status` walk, so per-path history costs O(commits) rather than a query per file.
+        Commits carry their 'parents', so branch membership can be derived from a single walk of all branches.
+        Merge commits list their changes against the first parent, as the REST change lists do.
+        """
+        pretty = '--format=%x01%H%x00%P%x00%an%x00%ad%x00%B%x00'
+        for record in self._records('log', '--no-renames', '--diff-merges=first-parent', '--name-status',
+                                    f'--date={DATE_FORMAT}', pretty,
+                                    *revisions, '--'):
+            if not record:
+                continue
+            commit_id, parents, author, date, message, changes = record.split(FIELD, 5)
+            # name-status lines are "<status>\t<path>"
+            paths = ['/' + line.split('\t', 1)[1] for line in changes.splitlines() if '\t' in line]
+            yield {'commitId': commit_id, 'comment': message.strip(), 'author': {'name': author, 'date': date},
+                   'parents': parents.split()}, paths
@@ -0,0 +1,194 @@
+import logging
+import threading
+import time
+import requests
+from requests.auth import HTTPBasicAuth
+from requests.adapters import HTTPAdapter
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from utils import rate_limiter, response_cache, metrics, adaptive_concurrency, deadlines, token_pool
+
+logger = logging.getLogger(__name__)
+
+# Number of per-host pools kept by each session and connections kept alive per host
+POOL_CONNECTIONS = 20
+POOL_MAXSIZE = 50
+
+MAX_RETRIES = 5
+BACKOFF_FACTOR = 0.5
+# 429 and Retry-After are left to the rate limiter so throttling slows every caller of the host, not just one connection
+STATUS_FORCELIST = [408, 500, 502, 503, 504]
+
+# Wall-clock bound of one request including its retries, in seconds
+REQUEST_DEADLINE = 900
+# A hedged GET sends a duplicate once the first attempt is slower than the endpoint's p95 (and this floor)
+HEDGE_MIN_DELAY = 1.0
+HEDGE_WORKERS = 32
+
+_hedging = False
+_hedge_executor = ThreadPoolExecutor(max_workers=HEDGE_WORKERS)
+
+_sessions = {}
+_sessions_lock = threading.Lock()
+
+
+def _build_session(pat):
+    """Create a session with keep-alive pools and retries for both http:// and https://."""
+    session = requests.Session()
+    if pat:
+        session.auth = HTTPBasicAuth('', pat)
+    retries = deadlines.BudgetedRetry(
+        total=MAX_RETRIES,
+        backoff_factor=BACKOFF_FACTOR,
+        status_forcelist=STATUS_FORCELIST,
+        allowed_methods=["HEAD", "GET", "OPTIONS"],
+        respect_retry_after_header=False,
+        raise_on_status=False
+    )
+    adapter = HTTPAdapter(pool_connections=POOL_CONNECTIONS, pool_maxsize=POOL_MAXSIZE, max_retries=retries)
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    return session
+
+
+def get_session(pat=None):
+    """Return the shared session for a PAT, creating it on first use."""
+    with _sessions_lock:
+        session = _sessions.get(pat)
+        if session is None:
+            session = _build_session(pat)
+            _sessions[pat] = session
+        return session
+
+
+def set_request_deadline(seconds):
+    """Change the default per-request deadline; None leaves requests bounded only by their timeout."""
+    global REQUEST_DEADLINE
+    REQUEST_DEADLINE = seconds
+
+
+def enable_hedging(enabled=True):
+    """Opt in to hedged GETs for every idempotent request sent through this module."""
+    global _hedging
+    _hedging = enabled
+
+
+def _send(pat, method, url, timeout, **kwargs):
+    for attempt in range(rate_limiter.MAX_THROTTLE_RETRIES + 1):
+        # With a PAT pool registered for the server, each attempt may go out under a different identity
+        chosen = token_pool.checkout(url, pat)
+        identity = response_cache.pat_identity(chosen)
+        response = None
+        try:
+            rate_limiter.acquire(url, identity)
+            deadlines.check(url)
+            if attempt == 0:
+                deadlines.retry_budget.deposit()
+            started = time.monotonic()
+            try:
+                response = get_session(chosen).request(method, url, timeout=deadlines.clamp_timeout(timeout), **kwargs)
+            except requests.exceptions.RequestException as e:
+                elapsed = time.monotonic() - started
+                metrics.record_error(method, url, elapsed, identity=identity)
+                adaptive_concurrency.observe(url, elapsed, timed_out=isinstance(
+                    e, (requests.exceptions.Timeout, requests.exceptions.ConnectionError)))
+                raise
+        finally:
+            token_pool.checkin(url, chosen, response)
+        elapsed = time.monotonic() - started
+        metrics.record_response(method, url, response, elapsed, retried=attempt > 0, identity=identity)
+        adaptive_concurrency.observe(url, elapsed, status_code=response.status_code)
+        rate_limiter.observe(url, response, identity)
+        if not rate_limiter.is_throttled(response) or attempt == rate_limiter.MAX_THROTTLE_RETRIES:
+            return response
+        logger.warning(f"Throttled ({response.status_code}) on attempt {attempt + 1} for URL {url}. Retrying...")
+        response.close()
+    return response
+
+
+def _discard(future):
+    if future.exception() is None:
+        future.result().close()
+
+
+def _send_hedged(pat, url, timeout, **kwargs):
+    """GET that issues a duplicate when the first attempt outlives the endpoint's p95; the first answer wins."""
+    delay = max(HEDGE_MIN_DELAY, metrics.percentile('GET', url, 95) or 0)
+    deadline = deadlines.current()
+
+    def attempt():
+        with deadlines.bind(deadline):
+            return _send(pat, 'GET', url, timeout, **kwargs)
+
+    primary = _hedge_executor.submit(attempt)
+    done, _ = wait([primary], timeout=delay)
+    if done:
+        return primary.result()
+    logger.info(f"Hedging request slower than {delay:.2f}s for URL {url}")
+    metrics.record_hedge('GET', url)
+    pending = {primary, _hedge_executor.submit(attempt)}
+    while pending:
+        done, pending = wait(pending, return_when=FIRST_COMPLETED)
+        for future in done:
+            if future.exception() is None:
+                for other in pending:
+                    other.add_done_callback(_discard)
+                return future.result()
+    return primary.result()
+
+
+def _fetch(pat, method, url, timeout, hedge, **kwargs):
+    if (_hedging if hedge is None else hedge) and method == 'GET' and not kwargs.get('stream'):
+        return _send_hedged(pat, url, timeout, **kwargs)
+    return _send(pat, method, url, timeout, **kwargs)
+
+
+def request(method, url, pat=None, timeout=300, deadline=None, hedge=None, **kwargs):
+    """Send a request through the shared pooled session for the given PAT.
+
+    Requests are paced by the per-host rate limiter; throttled (429/503 with Retry-After) responses are re-sent
+    once the server's Retry-After has elapsed. When the response cache is enabled, GETs are served from disk
+    for immutable resources and revalidated with If-None-Match/If-Modified-Since otherwise.
+    Each request, retries included, is bounded by `deadline` seconds (REQUEST_DEADLINE by default) and by
+    any enclosing deadlines.phase.
+    With hedging enabled (per call or through enable_hedging), slow GETs are raced against a duplicate.
+    When pat belongs to a pool registered with utils.token_pool, the request is sent with the least
+    throttled PAT of the pool (or the next one, round-robin).
+    """
+    with deadlines.phase('request', deadline if deadline is not None else REQUEST_DEADLINE):
+        return _request(method, url, pat, timeout, hedge, **kwargs)
+
+
+def _request(method, url, pat, timeout, hedge, **kwargs):
+    # Cache entries stay keyed by the caller's PAT even when a pool sends the request under another one
+    cache = response_cache.get_cache()
+    if cache is None or method != 'GET' or kwargs.get('stream'):
+        return _fetch(pat, method, url, timeout, hedge, **kwargs)
+
+    entry = cache.lookup(url, pat)
+    if entry and entry['immutable']:
+        metrics.record_cache_hit(method, url)
+        return cache.to_response(entry)
+    if entry:
+        kwargs['headers'] = {**(kwargs.get('headers') or {}), **cache.conditional_headers(entry)}
+    response = _fetch(pat, method, url, timeout, hedge, **kwargs)
+    if entry and response.status_code == 304:
+        metrics.record_cache_hit(method, url)
+        return cache.to_response(entry)
+    cache.store(url, pat, response)
+    return response
+
+
+def get(url, pat=None, timeout=300, **kwargs):
+    return request('GET', url, pat=pat, timeout=timeout, **kwargs)
+
+
+def post(url, pat=None, timeout=300, **kwargs):
+    return request('POST', url, pat=pat, timeout=timeout, **kwargs)
+
+
+def close_all():
+    """Close every pooled session, e.g. at the end of a run."""
+    with _sessions_lock:
+        for session in _sessions.values():
+            session.close()
+        _sessions.clear()
@@ -0,0 +1,139 @@
+import codecs
+import io
+import json
+import logging
+import re
+
+try:
+    import ijson
+except ImportError:  # pure-Python fallback below keeps streaming available without the C parser
+    ijson = None
+
+logger = logging.getLogger(__name__)
+
+CHUNK_SIZE = 64 * 1024
+
+_WHITESPACE = re.compile(r'[\s,]*')
+# Between the members of an object and between a member's name and value
+_MEMBER_SEPARATORS = re.compile(r'[\s,:]*')
+
+
+def _project(item, fields):
+    if fields is None or not isinstance(item, dict):
+        return item
+    return {field: item[field] for field in fields if field in item}
+
+
+def _is_loaded(response):
+    """True when the body was already read (stream=False, or a response cache hit) and raw holds nothing more."""
+    return response.raw is None or getattr(response, '_content_consumed', False)
+
+
+def _iter_with_ijson(response, key):
+    if _is_loaded(response):
+        source = io.BytesIO(response.content)
+    else:
+        response.raw.decode_content = True
+        source = response.raw
+    yield from ijson.items(source, f'{key}.item', use_float=True)
+
+
+def _iter_with_decoder(response, key):
+    decoder = json.JSONDecoder()
+    text_decoder = codecs.getincrementaldecoder(response.encoding or 'utf-8')(errors='replace')
+    if _is_loaded(response):
+        content = response.content
+        chunks = iter([content[start:start + CHUNK_SIZE] for start in range(0, len(content), CHUNK_SIZE)])
+    else:
+        chunks = response.iter_content(CHUNK_SIZE)
+    buffer = ''
+    exhausted = False
+
+    def read_more():
+        nonlocal buffer, exhausted
+        chunk = next(chunks, None)
+        if chunk is None:
+            buffer += text_decoder.decode(b'', final=True)
+            exhausted = True
+        else:
+            buffer += text_decoder.decode(chunk)
+
+    def next_position(separators):
+        """Index of the next character of buffer after separators, or None at the end of the stream."""
+        nonlocal buffer
+        while True:
+            position = separators.match(buffer).end()
+            if position < len(buffer):
+                return position
+            buffer = ''
+            if exhausted:
+                return None
+            read_more()
+
+    def next_value(separators):
+        """The next complete JSON value after separators, removed from buffer."""
+        nonlocal buffer
+        while True:
+            position = next_position(separators)
+            if position is None:
+                raise ValueError(f"Truncated JSON stream while reading '{key}'")
+            try:
+                value, end = decoder.raw_decode(buffer, position)
+            except json.JSONDecodeError:
+                if exhausted:
+                    raise
+                read_more()
+                continue
+            if end == len(buffer) and not exhausted:
+                # A scalar may continue in the next chunk; decode again once more data is in
+                read_more()
+                continue
+            buffer = buffer[end:]
+            return value
+
+    # Walk the members of the top-level object, skipping the values of other keys, up to the array's opening bracket
+    position = next_position(_WHITESPACE)
+    if position is None or buffer[position] != '{':
+        return
+    buffer = buffer[position + 1:]
+    while True:
+        position = next_position(_MEMBER_SEPARATORS)
+        if position is None:
+            raise ValueError(f"Truncated JSON stream while looking for '{key}'")
+        if buffer[position] == '}':
+            return
+        name = next_value(_MEMBER_SEPARATORS)
+        if name == key:
+            position = next_position(_MEMBER_SEPARATORS)
+            if position is None:
+                raise ValueError(f"Truncated JSON stream while reading '{key}'")
+            if buffer[position] != '[':
+                return
+            buffer = buffer[position + 1:]
+            break
+        next_value(_MEMBER_SEPARATORS)
+
+    while True:
+        position = next_position(_WHITESPACE)
+        if position is None:
+            raise ValueError(f"Truncated JSON stream while reading '{key}'")
+        if buffer[position] == ']':
+            return
+        yield next_value(_WHITESPACE)
+
+
+def iter_json_array(response, key='value', fields=None):
+    """Yield the elements of the top-level `key` array of a JSON response.
+
+    For a streamed (stream=True) response, elements are decoded one by one as bytes arrive, so memory stays
+    flat regardless of the payload size. A response whose body is already loaded (stream=False, or served
+    from the response cache) is decoded from its content the same way.
+    With fields, each element is projected down to those keys as soon as it is decoded.
+    """
+    try:
+        items = _iter_with_ijson(response, key) if ijson is not None else _iter_with_decoder(response, key)
+        for item in items:
+            yield _project(item, fields)
+    finally:
+        if not _is_loaded(response):
+            response.close()
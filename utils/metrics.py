@@ -0,0 +1,241 @@
+import json
+import logging
+import math
+import threading
+from datetime import datetime
+from utils.urls import endpoint_template
+
+logger = logging.getLogger(__name__)
+
+# Upper bounds (seconds) of the latency histogram buckets written to the JSON sidecar
+HISTOGRAM_BUCKETS = [0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60]
+
+PERFORMANCE_COLUMNS = ['Endpoint', 'Requests', 'p50 (ms)', 'p95 (ms)', 'p99 (ms)', 'Max (ms)', 'Bytes Received',
+                       'Retries', '429 Count', '5xx Count', 'Errors', 'Cache Hits', 'Hedged']
+
+IDENTITY_COLUMNS = ['PAT', 'Requests', 'Throttled', 'Errors', 'Mean Latency (ms)']
+
+
+class EndpointStats:
+    def __init__(self):
+        self.count = 0
+        self.latencies = []
+        self.bytes_received = 0
+        self.retries = 0
+        self.throttled = 0
+        self.server_errors = 0
+        self.errors = 0
+        self.cache_hits = 0
+        self.hedged = 0
+        self.cached_percentiles = {}
+
+    def percentile(self, percent):
+        if not self.latencies:
+            return None
+        ordered = sorted(self.latencies)
+        rank = max(1, math.ceil(percent / 100 * len(ordered)))
+        return ordered[rank - 1]
+
+    def recent_percentile(self, percent):
+        """Percentile recomputed only after the sample count grew by 10%, for use on the request path."""
+        cached = self.cached_percentiles.get(percent)
+        if cached is None or self.count - cached[0] >= max(20, cached[0] // 10):
+            cached = (self.count, self.percentile(percent))
+            self.cached_percentiles[percent] = cached
+        return cached[1]
+
+    def histogram(self):
+        buckets = {f"<={bound}s": 0 for bound in HISTOGRAM_BUCKETS}
+        buckets[f">{HISTOGRAM_BUCKETS[-1]}s"] = 0
+        for latency in self.latencies:
+            bound = next((b for b in HISTOGRAM_BUCKETS if latency <= b), None)
+            buckets[f"<={bound}s" if bound is not None else f">{HISTOGRAM_BUCKETS[-1]}s"] += 1
+        return buckets
+
+
+class IdentityStats:
+    def __init__(self):
+        self.count = 0
+        self.throttled = 0
+        self.errors = 0
+        self.total_latency = 0.0
+
+
+_stats = {}
+# Usage per PAT, keyed by a fingerprint so no token ever reaches a report
+_identities = {}
+_lock = threading.Lock()
+
+
+def _endpoint(method, url):
+    return f"{method} {endpoint_template(url)}"
+
+
+def _get(endpoint):
+    stats = _stats.get(endpoint)
+    if stats is None:
+        stats = EndpointStats()
+        _stats[endpoint] = stats
+    return stats
+
+
+def _record_identity(identity, elapsed, status_code=None):
+    if identity is None:
+        return
+    stats = _identities.get(identity)
+    if stats is None:
+        stats = IdentityStats()
+        _identities[identity] = stats
+    stats.count += 1
+    stats.total_latency += elapsed
+    if status_code is None:
+        stats.errors += 1
+    elif status_code == 429:
+        stats.throttled += 1
+
+
+def _retry_history(response):
+    retries = getattr(getattr(response, 'raw', None), 'retries', None)
+    return retries.history if retries is not None else ()
+
+
+def _count_when_closed(method, url, response):
+    """Add the body bytes a streamed response hands to its reader to its endpoint, once it is closed.
+
+    Bytes are counted as returned by the raw stream (decoded, like len(response.content) of a loaded body),
+    which works for chunked and compressed bodies alike.
+    """
+    raw = response.raw
+    counted = [0]
+    read, read_chunked, close = raw.read, raw.read_chunked, response.close
+
+    def counting_read(*args, **kwargs):
+        data = read(*args, **kwargs)
+        counted[0] += len(data)
+        return data
+
+    def counting_read_chunked(*args, **kwargs):
+        for data in read_chunked(*args, **kwargs):
+            counted[0] += len(data)
+            yield data
+
+    def close_and_count():
+        response.close = close
+        close()
+        with _lock:
+            _get(_endpoint(method, url)).bytes_received += counted[0]
+
+    raw.read, raw.read_chunked, response.close = counting_read, counting_read_chunked, close_and_count
+
+
+def record_response(method, url, response, elapsed, retried=False, identity=None):
+    """Record one completed request, including the retries urllib3 made underneath it.
+
+    retried marks a request re-sent by the client itself, e.g. after a throttled response.
+    identity is the fingerprint of the PAT the request was sent with.
+    """
+    history = _retry_history(response)
+    statuses = [entry.status for entry in history if entry.status is not None] + [response.status_code]
+    size = 0
+    # HEAD responses announce the length of a body that is never sent
+    if method != 'HEAD':
+        if getattr(response, '_content_consumed', False) or getattr(response, 'raw', None) is None:
+            size = len(response.content or b'')
+        else:
+            # A streamed body is counted once the caller has read it
+            _count_when_closed(method, url, response)
+    with _lock:
+        stats = _get(_endpoint(method, url))
+        stats.count += 1
+        stats.latencies.append(elapsed)
+        stats.bytes_received += size
+        stats.retries += len(history) + (1 if retried else 0)
+        stats.throttled += sum(1 for status in statuses if status == 429)
+        stats.server_errors += sum(1 for status in statuses if 500 <= status < 600)
+        _record_identity(identity, elapsed, response.status_code)
+
+
+def record_error(method, url, elapsed, identity=None):
+    with _lock:
+        stats = _get(_endpoint(method, url))
+        stats.count += 1
+        stats.latencies.append(elapsed)
+        stats.errors += 1
+        _record_identity(identity, elapsed)
+
+
+def record_cache_hit(method, url):
+    with _lock:
+        _get(_endpoint(method, url)).cache_hits += 1
+
+
+def record_hedge(method, url):
+    with _lock:
+        _get(_endpoint(method, url)).hedged += 1
+
+
+def percentile(method, url, percent):
+    """Observed latency percentile (seconds) of the endpoint url belongs to, or None without samples."""
+    with _lock:
+        stats = _stats.get(_endpoint(method, url))
+        return stats.recent_percentile(percent) if stats else None
+
+
+def snapshot():
+    """Per-endpoint rows in PERFORMANCE_COLUMNS order, busiest endpoint first."""
+    def to_ms(seconds):
+        return round(seconds * 1000, 1) if seconds is not None else None
+
+    with _lock:
+        rows = [{
+            'Endpoint': endpoint,
+            'Requests': stats.count,
+            'p50 (ms)': to_ms(stats.percentile(50)),
+            'p95 (ms)': to_ms(stats.percentile(95)),
+            'p99 (ms)': to_ms(stats.percentile(99)),
+            'Max (ms)': to_ms(max(stats.latencies)) if stats.latencies else None,
+            'Bytes Received': stats.bytes_received,
+            'Retries': stats.retries,
+            '429 Count': stats.throttled,
+            '5xx Count': stats.server_errors,
+            'Errors': stats.errors,
+            'Cache Hits': stats.cache_hits,
+            'Hedged': stats.hedged
+        } for endpoint, stats in _stats.items()]
+    return sorted(rows, key=lambda row: row['Requests'], reverse=True)
+
+
+def identity_snapshot():
+    """Per-PAT usage rows in IDENTITY_COLUMNS order."""
+    with _lock:
+        return [{
+            'PAT': identity,
+            'Requests': stats.count,
+            'Throttled': stats.throttled,
+            'Errors': stats.errors,
+            'Mean Latency (ms)': round(stats.total_latency / stats.count * 1000, 1) if stats.count else None
+        } for identity, stats in _identities.items()]
+
+
+def write_json(path):
+    """Write the metrics, including latency histograms, as a JSON sidecar next to a report."""
+    with _lock:
+        histograms = {endpoint: stats.histogram() for endpoint, stats in _stats.items()}
+    endpoints = snapshot()
+    for row in endpoints:
+        row['Latency Histogram'] = histograms[row['Endpoint']]
+    with open(path, 'w') as f:
+        json.dump({'generated': datetime.now().isoformat(), 'endpoints': endpoints, 'identities': identity_snapshot()},
+                  f, indent=2)
+    logger.info(f"Performance metrics written to {path}")
+
+
+def sidecar_path(report_path):
+    return report_path.rsplit('.', 1)[0] + '_performance.json'
+
+
+def reset():
+    """Drop the statistics gathered so far, so each report only covers the requests of its own project or repository."""
+    with _lock:
+        _stats.clear()
+        _identities.clear()
@@ -0,0 +1,89 @@
+import logging
+import re
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import quote
+from utils import deadlines
+from utils.json_stream import iter_json_array
+
+logger = logging.getLogger(__name__)
+
+CONTINUATION_HEADER = 'x-ms-continuationtoken'
+
+
+def with_query_param(url, name, value):
+    """Return url with the query parameter name set to value, replacing any previous value."""
+    url = re.sub(rf'([?&]){re.escape(name)}=[^&]*&?', r'\1', url).rstrip('&?')
+    separator = '&' if '?' in url else '?'
+    return f"{url}{separator}{name}={quote(str(value), safe='')}"
+
+
+def _fetch_within(deadline, fetch, url):
+    with deadlines.bind(deadline):
+        return fetch(url)
+
+
+def paginate(fetch, url, page_size=None, use_skip=False, skip_param='$skip', prefetch=True, dedup_key=None,
+             stream=False, fields=None, key='value'):
+    """Yield the items of a paged `key` list (`value` by default), one page at a time.
+
+    fetch(url) must return a response or None. Pages are followed through the x-ms-continuationtoken
+    header and, when use_skip is set, through skip_param while full pages of page_size keep coming back.
+    With prefetch, the next page is requested while the caller consumes the current one, within the
+    caller's deadline.
+    Items missing dedup_key (a field name or a function of the item), or repeating a value already seen,
+    are skipped; a page with nothing new ends the pagination so a server ignoring the paging parameters cannot cause an endless loop.
+    With stream, fetch must return stream=True responses; each page is decoded item by item and
+    projected down to fields, so a single huge page never has to fit in memory.
+    """
+    executor = ThreadPoolExecutor(max_workers=1) if prefetch else None
+    deadline = deadlines.current()
+    seen = set()
+    skip = 0
+    try:
+        pending = executor.submit(_fetch_within, deadline, fetch, url) if executor else None
+        next_url = url
+        while next_url:
+            response = pending.result() if executor else fetch(next_url)
+            if not response:
+                logger.error(f"Failed to retrieve page {next_url}; stopping pagination.")
+                return
+            if stream:
+                items = iter_json_array(response, key=key, fields=fields)
+            else:
+                response_data = response.json()
+                items = response_data.get(key) if isinstance(response_data, dict) else None
+                if not isinstance(items, list):
+                    logger.error(f"Unexpected response format: {response_data}")
+                    return
+                if not items:
+                    return
+
+            continuation_token = response.headers.get(CONTINUATION_HEADER)
+            if continuation_token:
+                next_url = with_query_param(url, 'continuationToken', continuation_token)
+            elif use_skip and page_size and not stream and len(items) >= page_size:
+                skip += len(items)
+                next_url = with_query_param(url, skip_param, skip)
+            else:
+                next_url = None
+            if executor and next_url:
+                pending = executor.submit(_fetch_within, deadline, fetch, next_url)
+
+            new_items = 0
+            for item in items:
+                if dedup_key is not None:
+                    if not isinstance(item, dict):
+                        logger.error(f"Unexpected format for item: {item}")
+                        continue
+                    item_key = dedup_key(item) if callable(dedup_key) else item.get(dedup_key)
+                    if not item_key or item_key in seen:
+                        continue
+                    seen.add(item_key)
+                new_items += 1
+                yield item
+            if not new_items and (stream or dedup_key is not None):
+                logger.info(f"No new items on page {response.url}; stopping pagination.")
+                return
+    finally:
+        if executor:
+            executor.shutdown(wait=False)
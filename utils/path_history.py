@@ -0,0 +1,44 @@
+import posixpath
+
+
+class PathHistory:
+    """Commit count and last change of every path, built from one newest-first walk over a branch's history.
+
+    A folder counts every commit that changed something below it, and its last change is the latest of those.
+    """
+
+    def __init__(self, entries=None):
+        # entries of an earlier walk (e.g. loaded from a previous run) to build on
+        self.entries = dict(entries or {})
+
+    def add_commit(self, commit, paths):
+        """Record a commit (REST-shaped dict) and the '/'-rooted paths it changed; commits must come newest first."""
+        touched = set()
+        for path in paths:
+            while path not in touched:
+                touched.add(path)
+                if path == '/':
+                    break
+                path = posixpath.dirname(path)
+        for path in touched:
+            entry = self.entries.get(path)
+            if entry is None:
+                self.entries[path] = {
+                    'commitId': commit['commitId'],
+                    'comment': commit['comment'],
+                    'author': commit['author']['name'],
+                    'date': commit['author']['date'],
+                    'count': 1
+                }
+            else:
+                entry['count'] += 1
+
+    def merge_newer(self, newer):
+        """Fold in the history of commits that are all newer than the ones already recorded."""
+        for path, entry in newer.entries.items():
+            previous = self.entries.get(path)
+            self.entries[path] = dict(entry, count=entry['count'] + previous['count']) if previous else entry
+
+    def get(self, path):
+        """{'commitId', 'comment', 'author', 'date', 'count'} of path, or None if no walked commit changed it."""
+        return self.entries.get(path)
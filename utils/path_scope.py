@@ -0,0 +1,83 @@
+import posixpath
+import re
+from fnmatch import fnmatchcase
+
+
+def split_patterns(value):
+    """Paths or globs of an input form cell, separated by ';', ',' or new lines."""
+    if not isinstance(value, str):
+        return []
+    return [part.strip() for part in re.split(r'[;,\n]', value) if part.strip()]
+
+
+def normalize_path(path):
+    """'/'-rooted path without a trailing slash, as the REST API reports item paths."""
+    return posixpath.normpath('/' + path.strip().replace('\\', '/').lstrip('/'))
+
+
+class PathScope:
+    """Subtrees of a repository (scope paths) narrowed by include and exclude globs.
+
+    Globs are matched against '/'-rooted paths with fnmatch, where '*' also matches '/'. An excluded folder
+    excludes everything below it; include globs select files, and a folder is kept while it holds a kept file.
+    The default scope is the whole repository.
+    """
+
+    def __init__(self, paths=None, include=None, exclude=None):
+        paths = sorted({normalize_path(path) for path in paths or []}) or ['/']
+        # A scope path below another one adds nothing
+        self.paths = [path for path in paths if not any(self._below(path, other) for other in paths if other != path)]
+        self.include = list(include or [])
+        self.exclude = list(exclude or [])
+
+    @staticmethod
+    def _below(path, folder):
+        return folder == '/' or path == folder or path.startswith(folder + '/')
+
+    def __bool__(self):
+        """True when the scope restricts discovery to less than the whole repository."""
+        return self.paths != ['/'] or bool(self.include) or bool(self.exclude)
+
+    def key(self):
+        """Stable text identifying the scope, e.g. to keep per-scope state apart."""
+        return '|'.join([','.join(self.paths), ','.join(self.include), ','.join(self.exclude)])
+
+    def contains(self, path):
+        return any(self._below(path, folder) for folder in self.paths)
+
+    def excluded(self, path):
+        while True:
+            if any(fnmatchcase(path, pattern) for pattern in self.exclude):
+                return True
+            if path == '/':
+                return False
+            path = posixpath.dirname(path)
+
+    def includes_file(self, path):
+        return not self.include or any(fnmatchcase(path, pattern) for pattern in self.include)
+
+    def allows_file(self, path):
+        return self.contains(path) and not self.excluded(path) and self.includes_file(path)
+
+    def filter_paths(self, paths):
+        """Changed file paths that fall within the scope."""
+        return [path for path in paths if self.allows_file(path)]
+
+    def filter_items(self, items):
+        """Items (REST item listing shape) within the scope; folders are kept while they hold a kept file."""
+        files = [item for item in items if not item.get('isFolder', item.get('gitObjectType') == 'tree')
+                 and self.allows_file(item['path'])]
+        if not self.include:
+            folders = {item['path'] for item in items if item.get('isFolder', item.get('gitObjectType') == 'tree')
+                       and self.contains(item['path']) and not self.excluded(item['path'])}
+        else:
+            folders = set()
+            for item in files:
+                path = posixpath.dirname(item['path'])
+                while path not in folders and self.contains(path):
+                    folders.add(path)
+                    if path == '/':
+                        break
+                    path = posixpath.dirname(path)
+        kept = {item['path'] for item in files} | folders
+        return [item for item in items if item['path'] in kept]
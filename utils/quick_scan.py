@@ -0,0 +1,71 @@
+import logging
+from urllib.parse import quote
+from utils import http_client, async_engine
+from utils.pagination import paginate
+
+logger = logging.getLogger(__name__)
+
+QUICK_SCAN_COLUMNS = ['Collection Name', 'Project Name', 'Repository Name', 'Size (Bytes)', 'Size (MB)',
+                      'Default Branch', 'Branch Count', 'Tag Count', 'Last Push Date']
+# Refs requested per page when counting branches and tags
+REFS_PAGE_SIZE = 1000
+
+
+def _encode(component):
+    return quote(component, safe='')
+
+
+def count_refs(server_url, project, repository_id, pat, api_version='6.0'):
+    """(branch count, tag count) of a repository from one listing of its refs."""
+    url = f'{server_url}/{_encode(project)}/_apis/git/repositories/{_encode(repository_id)}/refs?$top={REFS_PAGE_SIZE}&api-version={api_version}'
+    branches = tags = 0
+    for ref in paginate(lambda page_url: http_client.get(page_url, pat), url, dedup_key='name'):
+        if ref['name'].startswith('refs/heads/'):
+            branches += 1
+        elif ref['name'].startswith('refs/tags/'):
+            tags += 1
+    return branches, tags
+
+
+def get_last_push_date(server_url, project, repository_id, pat, api_version='6.0'):
+    """Date of the repository's most recent push, or None if it was never pushed to."""
+    url = f'{server_url}/{_encode(project)}/_apis/git/repositories/{_encode(repository_id)}/pushes?$top=1&api-version={api_version}'
+    response = http_client.get(url, pat)
+    if not response:
+        logger.warning(f"Failed to retrieve pushes for URL {url}. Status code: {response.status_code}")
+        return None
+    pushes = response.json().get('value', [])
+    return pushes[0]['date'] if pushes else None
+
+
+def scan_repository(server_url, project, repository, pat, api_version='6.0'):
+    """Inventory row of a repository (an entry of the repositories listing) from metadata alone: no trees or histories."""
+    branches, tags = count_refs(server_url, project, repository['id'], pat, api_version)
+    size = repository.get('size') or 0
+    return {
+        'Collection Name': server_url.split('/')[-1],
+        'Project Name': project,
+        'Repository Name': repository['name'],
+        'Size (Bytes)': size,
+        'Size (MB)': round(size / (1024 * 1024), 2),
+        'Default Branch': (repository.get('defaultBranch') or '').replace('refs/heads/', ''),
+        'Branch Count': branches,
+        'Tag Count': tags,
+        'Last Push Date': get_last_push_date(server_url, project, repository['id'], pat, api_version)
+    }
+
+
+def scan_project(server_url, project, pat, repository_names=None, api_version='6.0'):
+    """Inventory rows of a project's repositories (only repository_names when given), scanned concurrently."""
+    url = f'{server_url}/{_encode(project)}/_apis/git/repositories?api-version={api_version}'
+    response = http_client.get(url, pat)
+    if not response:
+        logger.error(f"Failed to retrieve repositories for project '{project}'. Status code: {response.status_code}")
+        return []
+    repositories = response.json().get('value', [])
+    if repository_names:
+        wanted = {name.lower() for name in repository_names}
+        repositories = [repository for repository in repositories if repository['name'].lower() in wanted]
+    rows = async_engine.fan_out(
+        server_url, lambda repository: scan_repository(server_url, project, repository, pat, api_version), repositories)
+    return [row for row in rows if row]
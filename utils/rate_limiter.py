@@ -0,0 +1,175 @@
+import logging
+import os
+import threading
+import time
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from utils.urls import host_key
+
+logger = logging.getLogger(__name__)
+
+# Pacing applied to a host once its responses show throttling; until then its requests are not paced
+DEFAULT_RATE = 20.0  # requests per second
+DEFAULT_BURST = 20
+# Environment variables pacing every host from its first request, e.g. for servers that never send throttling headers
+RATE_ENV = 'ADO_RATE_LIMIT'
+BURST_ENV = 'ADO_RATE_BURST'
+MIN_RATE = 0.5
+SLOW_DOWN_FACTOR = 0.5
+RECOVERY_FACTOR = 1.05
+# Fraction of X-RateLimit-Limit below which pacing is tightened before the server starts rejecting
+LOW_REMAINING_RATIO = 0.1
+
+# Number of times a throttled request is re-sent after waiting out Retry-After
+MAX_THROTTLE_RETRIES = 5
+MAX_RETRY_AFTER = 300
+MAX_BACKOFF = 30
+
+
+class TokenBucket:
+    """Token bucket for one host and identity whose refill rate follows the server's throttling headers.
+
+    An unpaced bucket lets requests through at once (still honouring Retry-After) until the first sign of throttling.
+    """
+
+    def __init__(self, rate=DEFAULT_RATE, capacity=DEFAULT_BURST, paced=False):
+        self.paced = paced
+        self.max_rate = rate
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = float(capacity)
+        self.updated = time.monotonic()
+        self.blocked_until = 0.0
+        self.lock = threading.Lock()
+
+    def _refill(self, now):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def acquire(self):
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self._refill(now)
+                wait = self.blocked_until - now
+                if wait <= 0:
+                    if not self.paced:
+                        return
+                    if self.tokens >= 1:
+                        self.tokens -= 1
+                        return
+                    wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+    def block_for(self, seconds):
+        with self.lock:
+            now = time.monotonic()
+            self.blocked_until = max(self.blocked_until, now + seconds)
+            self.tokens = 0.0
+            self.updated = now
+
+    def slow_down(self):
+        with self.lock:
+            if not self.paced:
+                self.paced = True
+                self._refill(time.monotonic())
+            self.rate = max(MIN_RATE, self.rate * SLOW_DOWN_FACTOR)
+
+    def recover(self):
+        with self.lock:
+            self.rate = min(self.max_rate, self.rate * RECOVERY_FACTOR)
+
+
+_buckets = {}
+_buckets_lock = threading.Lock()
+# (rate, burst) pacing every host from its first request, or None to pace hosts only once they throttle
+_fixed_rate = None
+
+
+def set_rate(rate, burst=None):
+    """Pace every host at rate requests per second (bursts of burst) from its first request; None restores the default."""
+    global _fixed_rate
+    with _buckets_lock:
+        _fixed_rate = (float(rate), int(burst or max(1, round(rate)))) if rate else None
+        _buckets.clear()
+
+
+def get_bucket(url, identity=None):
+    # Azure DevOps throttles per identity, so every PAT gets its own bucket on a host
+    key = (host_key(url), identity)
+    with _buckets_lock:
+        bucket = _buckets.get(key)
+        if bucket is None:
+            bucket = TokenBucket(*_fixed_rate, paced=True) if _fixed_rate else TokenBucket()
+            _buckets[key] = bucket
+        return bucket
+
+
+def parse_retry_after(value):
+    """Return the wait in seconds encoded by a Retry-After header (delta-seconds or HTTP date)."""
+    if not value:
+        return None
+    try:
+        seconds = float(value)
+    except ValueError:
+        try:
+            retry_at = parsedate_to_datetime(value)
+        except (TypeError, ValueError):
+            return None
+        seconds = (retry_at - datetime.now(timezone.utc)).total_seconds()
+    return min(max(seconds, 0.0), MAX_RETRY_AFTER)
+
+
+def header_float(headers, name):
+    try:
+        return float(headers.get(name))
+    except (TypeError, ValueError):
+        return None
+
+
+def acquire(url, identity=None):
+    """Block until the host of url may be sent another request by identity."""
+    get_bucket(url, identity).acquire()
+
+
+def observe(url, response, identity=None):
+    """Adjust the pacing of the host of url for identity from a response's throttling headers."""
+    bucket = get_bucket(url, identity)
+    headers = response.headers
+    retry_after = parse_retry_after(headers.get('Retry-After'))
+    delay = header_float(headers, 'X-RateLimit-Delay')
+    remaining = header_float(headers, 'X-RateLimit-Remaining')
+    limit = header_float(headers, 'X-RateLimit-Limit')
+
+    if retry_after is not None:
+        logger.warning(f"Server asked to retry after {retry_after:.1f}s for host {host_key(url)}")
+        bucket.block_for(retry_after)
+        bucket.slow_down()
+    elif response.status_code == 429:
+        bucket.block_for(MAX_BACKOFF)
+        bucket.slow_down()
+    elif delay:
+        logger.info(f"Request delayed {delay:.3f}s by server throttling on host {host_key(url)}")
+        bucket.slow_down()
+    elif remaining is not None and limit and remaining / limit < LOW_REMAINING_RATIO:
+        bucket.slow_down()
+    else:
+        bucket.recover()
+
+
+def is_throttled(response):
+    """True for responses the server rejected because of throttling."""
+    return response.status_code == 429 or (response.status_code == 503 and 'Retry-After' in response.headers)
+
+
+def retry_delay(response, attempt):
+    """Seconds to wait before retrying a failed request: Retry-After if sent, else capped exponential backoff."""
+    if response is not None:
+        retry_after = parse_retry_after(response.headers.get('Retry-After'))
+        if retry_after is not None:
+            return retry_after
+    return min(2 ** attempt, MAX_BACKOFF)
+
+
+if os.environ.get(RATE_ENV):
+    set_rate(float(os.environ[RATE_ENV]), int(os.environ[BURST_ENV]) if os.environ.get(BURST_ENV) else None)
@@ -0,0 +1,178 @@
+import atexit
+import hashlib
+import io
+import json
+import logging
+import os
+import re
+import threading
+import time
+import requests
+from requests.structures import CaseInsensitiveDict
+from utils import sqlite_store
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CACHE_DIR = os.path.join('.cache', 'http')
+DEFAULT_MAX_BYTES = 2 * 1024 ** 3
+# Access times of cache hits are written together, every this many hits or seconds, so hits do not each take the write lock
+ACCESS_FLUSH_SIZE = 500
+ACCESS_FLUSH_INTERVAL = 30
+
+# Resources addressed by an object ID never change, so they are served from disk without revalidation
+IMMUTABLE_PATTERNS = [
+    re.compile(r'/_apis/git/repositories/[^/?]+/(blobs|trees|annotatedtags)/[0-9a-f]{40}(\?|$)', re.IGNORECASE),
+    re.compile(r'/_apis/git/repositories/[^/?]+/commits/[0-9a-f]{40}(/changes)?(\?|$)', re.IGNORECASE),
+    re.compile(r'/_apis/tfvc/changesets/\d+(/changes)?(\?|$)', re.IGNORECASE),
+]
+
+
+def is_immutable(url):
+    return any(pattern.search(url) for pattern in IMMUTABLE_PATTERNS)
+
+
+def pat_identity(pat):
+    """Stable, non-reversible identity of a PAT, so cached data is never shared across credentials."""
+    return hashlib.sha256((pat or '').encode()).hexdigest()[:16]
+
+
+class ResponseCache:
+    """Persistent GET response cache with ETag/Last-Modified revalidation and LRU eviction."""
+
+    def __init__(self, directory=DEFAULT_CACHE_DIR, max_bytes=DEFAULT_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self.lock = threading.Lock()
+        self.connection = sqlite_store.connect(os.path.join(directory, 'responses.sqlite'))
+        self.connection.execute(
+            'CREATE TABLE IF NOT EXISTS responses ('
+            'key TEXT PRIMARY KEY, url TEXT, headers TEXT, body BLOB, etag TEXT, last_modified TEXT, '
+            'immutable INTEGER, size INTEGER, last_access REAL)')
+        self.connection.execute('CREATE INDEX IF NOT EXISTS responses_last_access ON responses (last_access)')
+        self.connection.commit()
+        self.total_bytes = self.connection.execute('SELECT COALESCE(SUM(size), 0) FROM responses').fetchone()[0]
+        # key -> last access time of hits not written yet
+        self.accessed = {}
+        self.flushed = time.monotonic()
+
+    @staticmethod
+    def _key(url, pat):
+        return hashlib.sha256(f"{pat_identity(pat)} {url}".encode()).hexdigest()
+
+    def lookup(self, url, pat):
+        """Return the cached entry for url as a dict, or None."""
+        key = self._key(url, pat)
+        with self.lock:
+            row = self.connection.execute(
+                'SELECT headers, body, etag, last_modified, immutable FROM responses WHERE key = ?', (key,)).fetchone()
+            if row is None:
+                return None
+            self.accessed[key] = time.time()
+            if len(self.accessed) >= ACCESS_FLUSH_SIZE or time.monotonic() - self.flushed >= ACCESS_FLUSH_INTERVAL:
+                self._flush_accesses()
+                self.connection.commit()
+        headers, body, etag, last_modified, immutable = row
+        return {'url': url, 'headers': json.loads(headers), 'body': body, 'etag': etag,
+                'last_modified': last_modified, 'immutable': bool(immutable)}
+
+    def store(self, url, pat, response):
+        """Cache a 200 response if it is immutable or carries a validator to revalidate it with."""
+        if response.status_code != 200:
+            return
+        etag = response.headers.get('ETag')
+        last_modified = response.headers.get('Last-Modified')
+        immutable = is_immutable(url)
+        if not (etag or last_modified or immutable):
+            return
+        body = response.content
+        size = len(body)
+        if size > self.max_bytes:
+            return
+        key = self._key(url, pat)
+        with self.lock:
+            previous = self.connection.execute('SELECT size FROM responses WHERE key = ?', (key,)).fetchone()
+            self.connection.execute(
+                'INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                (key, url, json.dumps(dict(response.headers)), body, etag, last_modified, int(immutable), size, time.time()))
+            self.total_bytes += size - (previous[0] if previous else 0)
+            self._evict()
+            self.connection.commit()
+
+    def _flush_accesses(self):
+        if self.accessed:
+            self.connection.executemany('UPDATE responses SET last_access = ? WHERE key = ?',
+                                        [(accessed, key) for key, accessed in self.accessed.items()])
+            self.accessed = {}
+        self.flushed = time.monotonic()
+
+    def _evict(self):
+        if self.total_bytes > self.max_bytes:
+            # Recent hits must count before the least recently used entries are picked
+            self._flush_accesses()
+        while self.total_bytes > self.max_bytes:
+            rows = self.connection.execute(
+                'SELECT key, size FROM responses ORDER BY last_access LIMIT 100').fetchall()
+            if not rows:
+                self.total_bytes = 0
+                return
+            for key, size in rows:
+                self.connection.execute('DELETE FROM responses WHERE key = ?', (key,))
+                self.total_bytes -= size
+                if self.total_bytes <= self.max_bytes:
+                    break
+        logger.debug(f"Response cache holds {self.total_bytes} bytes")
+
+    @staticmethod
+    def conditional_headers(entry):
+        headers = {}
+        if entry.get('etag'):
+            headers['If-None-Match'] = entry['etag']
+        if entry.get('last_modified'):
+            headers['If-Modified-Since'] = entry['last_modified']
+        return headers
+
+    @staticmethod
+    def to_response(entry):
+        """Rebuild a requests.Response from a cached entry."""
+        response = requests.Response()
+        response.status_code = 200
+        response.reason = 'OK'
+        response.url = entry['url']
+        response.headers = CaseInsensitiveDict(entry['headers'])
+        response.encoding = requests.utils.get_encoding_from_headers(response.headers)
+        response._content = entry['body']
+        # Behave like a non-streamed response: the body is loaded and closing it is a no-op
+        response._content_consumed = True
+        response.raw = io.BytesIO(b'')
+        response.from_cache = True
+        return response
+
+    def close(self):
+        with self.lock:
+            self._flush_accesses()
+            self.connection.commit()
+            self.connection.close()
+
+
+_cache = None
+
+
+def enable(directory=DEFAULT_CACHE_DIR, max_bytes=DEFAULT_MAX_BYTES):
+    """Turn on response caching for every GET sent through utils.http_client."""
+    global _cache
+    if _cache is None:
+        _cache = ResponseCache(directory, max_bytes)
+        # Writes the access times of the last hits
+        atexit.register(disable)
+        logger.info(f"Response cache enabled at {directory} with a budget of {max_bytes} bytes")
+    return _cache
+
+
+def disable():
+    global _cache
+    if _cache is not None:
+        _cache.close()
+        _cache = None
+
+
+def get_cache():
+    return _cache
@@ -0,0 +1,23 @@
+import os
+import sqlite3
+
+# Seconds to wait for the write lock held by discovery workers in other processes
+SQLITE_TIMEOUT = 60
+# SQLite limits the number of bound parameters per statement
+LOOKUP_CHUNK = 500
+
+
+def connect(path):
+    """Connection to the SQLite file at path, shared by the threads of one process and waiting for other processes' locks."""
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    return sqlite3.connect(path, check_same_thread=False, timeout=SQLITE_TIMEOUT)
+
+
+def select_in(connection, query, keys):
+    """Rows of query for keys, where query holds one '{placeholders}' for its IN (...) list; run in chunks."""
+    keys = list(dict.fromkeys(keys))
+    rows = []
+    for start in range(0, len(keys), LOOKUP_CHUNK):
+        chunk = keys[start:start + LOOKUP_CHUNK]
+        rows.extend(connection.execute(query.format(placeholders=','.join('?' * len(chunk))), chunk).fetchall())
+    return rows
@@ -0,0 +1,124 @@
+import itertools
+import logging
+import re
+import threading
+import time
+from utils import rate_limiter
+
+logger = logging.getLogger(__name__)
+
+STRATEGIES = ('least-throttled', 'round-robin')
+DEFAULT_STRATEGY = 'least-throttled'
+# Share of the pressure kept after each unthrottled response, so an identity recovers gradually
+PRESSURE_DECAY = 0.8
+
+_SEPARATORS = re.compile(r'[;,\s]+')
+
+
+def split_pats(value):
+    """PATs of an input form cell; several may be given separated by ';', ',' or new lines."""
+    if value is None or not isinstance(value, str):
+        return []
+    return [pat for pat in _SEPARATORS.split(value.strip()) if pat]
+
+
+def primary_pat(value):
+    """First PAT of an input form cell; requests made with it are spread over the whole pool."""
+    pats = split_pats(value)
+    return pats[0] if pats else value
+
+
+class _Identity:
+    def __init__(self, pat):
+        self.pat = pat
+        self.in_flight = 0
+        self.blocked_until = 0.0
+        # 0 while the server reports plenty of headroom, towards 1 as it throttles this identity
+        self.pressure = 0.0
+
+
+class TokenPool:
+    """PATs usable interchangeably against one server, steered away from throttled identities."""
+
+    def __init__(self, server_url, pats, strategy=DEFAULT_STRATEGY):
+        if strategy not in STRATEGIES:
+            raise ValueError(f"Unknown PAT strategy '{strategy}', expected one of {STRATEGIES}")
+        self.server_url = server_url
+        self.strategy = strategy
+        self.identities = {pat: _Identity(pat) for pat in pats}
+        self.cycle = itertools.cycle(list(self.identities.values()))
+        self.lock = threading.Lock()
+
+    def __contains__(self, pat):
+        return pat in self.identities
+
+    def checkout(self):
+        with self.lock:
+            now = time.monotonic()
+            available = [i for i in self.identities.values() if i.blocked_until <= now]
+            if not available:
+                # Every identity is throttled: use the one that becomes usable first
+                chosen = min(self.identities.values(), key=lambda i: i.blocked_until)
+            elif self.strategy == 'round-robin':
+                chosen = next(i for i in self.cycle if i.blocked_until <= now)
+            else:
+                chosen = min(available, key=lambda i: (i.pressure, i.in_flight))
+            chosen.in_flight += 1
+            return chosen.pat
+
+    def checkin(self, pat, response=None):
+        with self.lock:
+            identity = self.identities[pat]
+            identity.in_flight -= 1
+            if response is None:
+                return
+            headers = response.headers
+            retry_after = rate_limiter.parse_retry_after(headers.get('Retry-After'))
+            remaining = rate_limiter.header_float(headers, 'X-RateLimit-Remaining')
+            limit = rate_limiter.header_float(headers, 'X-RateLimit-Limit')
+            if retry_after is not None or response.status_code == 429:
+                wait = retry_after if retry_after is not None else rate_limiter.MAX_BACKOFF
+                identity.blocked_until = max(identity.blocked_until, time.monotonic() + wait)
+                identity.pressure = 1.0
+            elif remaining is not None and limit:
+                identity.pressure = max(0.0, 1 - remaining / limit)
+            elif rate_limiter.header_float(headers, 'X-RateLimit-Delay'):
+                identity.pressure = min(1.0, identity.pressure + 0.25)
+            else:
+                identity.pressure *= PRESSURE_DECAY
+
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def register(server_url, pats, strategy=DEFAULT_STRATEGY):
+    """Spread requests to server_url that are made with any of pats across all of them."""
+    pats = list(dict.fromkeys(pats))
+    if len(pats) < 2:
+        return
+    key = server_url.rstrip('/').lower()
+    with _pools_lock:
+        _pools[key] = TokenPool(server_url.rstrip('/'), pats, strategy)
+    logger.info(f"Using {len(pats)} PATs ({strategy}) for {server_url}")
+
+
+def _match(url, pat):
+    lowered = url.lower()
+    with _pools_lock:
+        matches = [key for key in _pools
+                   if (lowered == key or lowered.startswith(key + '/')) and (pat is None or pat in _pools[key])]
+        return _pools[max(matches, key=len)] if matches else None
+
+
+def checkout(url, pat):
+    """PAT to send the next request to url with: pat itself unless it belongs to a registered pool."""
+    pool = _match(url, pat)
+    return pool.checkout() if pool else pat
+
+
+def checkin(url, pat, response=None):
+    """Report the outcome of a request sent with a PAT returned by checkout."""
+    pool = _match(url, pat)
+    if pool:
+        pool.checkin(pat, response)
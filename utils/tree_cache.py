@@ -0,0 +1,87 @@
+import posixpath
+
+
+class TreeCache:
+    """Direct entries of Git tree objects keyed by tree ID, shared by every branch of a repository.
+
+    Trees are content-addressed, so a subtree that is identical on several branches is listed once and each
+    branch's item listing is rebuilt from the cached trees.
+    """
+
+    def __init__(self):
+        self.trees = {}
+
+    def __contains__(self, tree_id):
+        return tree_id in self.trees
+
+    def __len__(self):
+        return len(self.trees)
+
+    @staticmethod
+    def _entry(name, entry):
+        return {'name': name, 'objectId': entry['objectId'], 'gitObjectType': entry['gitObjectType']}
+
+    def add(self, tree_id, entries):
+        """Store a tree from its non-recursive REST listing (each entry's relativePath is its name)."""
+        self.trees[tree_id] = [self._entry(entry['relativePath'], entry) for entry in entries]
+
+    def add_recursive(self, tree_id, entries):
+        """Store a tree and every subtree below it from one recursive REST listing."""
+        children = {'': []}
+        tree_ids = {'': tree_id}
+        for entry in entries:
+            parent, name = posixpath.split(entry['relativePath'])
+            children.setdefault(parent, []).append(self._entry(name, entry))
+            if entry['gitObjectType'] == 'tree':
+                tree_ids[entry['relativePath']] = entry['objectId']
+        for path, subtree_id in tree_ids.items():
+            self.trees.setdefault(subtree_id, children.get(path, []))
+
+    def resolve(self, tree_id, path):
+        """ID of the folder at a '/'-rooted path below tree_id, or None if there is no such folder.
+
+        Raises KeyError with the ID of the first tree on the way that is not cached yet.
+        """
+        for name in [part for part in path.split('/') if part]:
+            if tree_id not in self.trees:
+                raise KeyError(tree_id)
+            entry = next((entry for entry in self.trees[tree_id] if entry['name'] == name), None)
+            if entry is None or entry['gitObjectType'] != 'tree':
+                return None
+            tree_id = entry['objectId']
+        return tree_id
+
+    def missing(self, tree_id):
+        """IDs of the trees below tree_id (itself included) that are not cached but whose parent is."""
+        if tree_id not in self.trees:
+            return [tree_id]
+        missing = []
+        seen = set()
+        stack = [tree_id]
+        while stack:
+            for entry in self.trees[stack.pop()]:
+                subtree_id = entry['objectId']
+                if entry['gitObjectType'] != 'tree' or subtree_id in seen:
+                    continue
+                seen.add(subtree_id)
+                if subtree_id in self.trees:
+                    stack.append(subtree_id)
+                else:
+                    missing.append(subtree_id)
+        return missing
+
+    def items(self, tree_id, path='/'):
+        """Every item below a cached tree found at path, that folder first, shaped like the REST full-recursion item listing."""
+        items = [{'path': path, 'objectId': tree_id, 'gitObjectType': 'tree', 'isFolder': True}]
+
+        def walk(prefix, subtree_id):
+            for entry in self.trees[subtree_id]:
+                path = f"{prefix}/{entry['name']}"
+                is_folder = entry['gitObjectType'] == 'tree'
+                items.append({'path': path, 'objectId': entry['objectId'], 'gitObjectType': entry['gitObjectType'],
+                              'isFolder': is_folder})
+                if is_folder:
+                    walk(path, entry['objectId'])
+
+        walk(path.rstrip('/'), tree_id)
+        return items
@@ -0,0 +1,38 @@
+import re
+from urllib.parse import urlsplit, unquote
+
+
+def host_key(url):
+    """Return scheme://host[:port] of a URL, lower-cased, for per-host bookkeeping."""
+    parts = urlsplit(url)
+    return f"{parts.scheme}://{parts.netloc}".lower()
+
+
+_GUID = re.compile(r'^[0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12}$', re.IGNORECASE)
+_SHA1 = re.compile(r'^[0-9a-f]{40}$', re.IGNORECASE)
+# Segments whose following segment is a caller-supplied name or ID
+_NAMED_PARENTS = {'repositories': '{repository}', 'annotatedtags': '{sha}', 'shelvesets': '{shelveset}'}
+
+
+def endpoint_template(url):
+    """Collapse a REST URL to its endpoint, e.g. git/repositories/{repository}/commits/{sha}.
+
+    The server, collection and project prefix before _apis, the query string and IDs are dropped so
+    that calls to the same API group together.
+    """
+    path = unquote(urlsplit(url).path)
+    if '/_apis/' in path:
+        path = path.split('/_apis/', 1)[1]
+    segments = []
+    placeholder = None
+    for segment in path.strip('/').split('/'):
+        if placeholder:
+            segments.append(placeholder)
+        elif _SHA1.match(segment):
+            segments.append('{sha}')
+        elif _GUID.match(segment) or segment.isdigit():
+            segments.append('{id}')
+        else:
+            segments.append(segment.lower())
+        placeholder = _NAMED_PARENTS.get(segment.lower()) if not placeholder else None
+    return '/'.join(segments)
@@ -0,0 +1,56 @@
+import logging
+import sys
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+try:
+    import resource
+except ImportError:  # not available on Windows; memory ceilings are then not enforced
+    resource = None
+
+logger = logging.getLogger(__name__)
+
+# Jobs a worker process runs before it is replaced, returning its memory to the OS
+WORKER_MAX_TASKS = 10
+
+
+def limit_memory(megabytes):
+    """Cap the data segment of the current process, so an oversized job fails with MemoryError in its own worker."""
+    if not megabytes:
+        return
+    if resource is None:
+        logger.warning(f"Memory ceiling of {megabytes} MB is not enforced on this platform")
+        return
+    # RLIMIT_DATA counts allocated heap, not the address space threads and arenas merely reserve
+    limit = getattr(resource, 'RLIMIT_DATA', resource.RLIMIT_AS)
+    ceiling = int(megabytes) * 1024 * 1024
+    _, hard = resource.getrlimit(limit)
+    if hard != resource.RLIM_INFINITY:
+        ceiling = min(ceiling, hard)
+    resource.setrlimit(limit, (ceiling, hard))
+
+
+def peak_memory_mb():
+    """Peak resident memory of the current process in MB, or None where it cannot be measured."""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in bytes on macOS and in kilobytes elsewhere
+    return round(peak / (1024 * 1024 if sys.platform == 'darwin' else 1024), 1)
+
+
+def run_jobs(func, jobs, workers, initializer=None, initargs=(), on_failure=None):
+    """Yield func(*job) for every job, run in up to workers processes, in completion order.
+
+    A job whose worker raised or died yields on_failure(job, error) instead, so one job cannot stop the rest.
+    """
+    with ProcessPoolExecutor(max_workers=workers, initializer=initializer, initargs=initargs,
+                             max_tasks_per_child=WORKER_MAX_TASKS) as executor:
+        futures = {executor.submit(func, *job): job for job in jobs}
+        for future in as_completed(futures):
+            try:
+                yield future.result()
+            except Exception as e:
+                # Jobs carry PATs, so only the error is logged
+                logger.error(f"Worker process failed: {e}")
+                if on_failure is not None:
+                    yield on_failure(futures[future], e)
@@ -1,15 +1,14 @@
 import os
 import requests
-from requests.auth import HTTPBasicAuth
 import pandas as pd
 import re
 import html
 import logging
 from datetime import datetime
 import getpass
-from urllib3.util.retry import Retry
-from requests.adapters import HTTPAdapter
-from utils.common import get_project_names, add_if_not_exists
+from utils.common import get_project_names, add_if_not_exists, apply_concurrency_settings, apply_token_pools
+from utils import http_client, async_engine, response_cache, metrics
+from utils.token_pool import primary_pat
 
 log_dir = "logs"
 if not os.path.exists(log_dir):
@@ -42,16 +41,11 @@ def sanitize_sheet_name(name):
 
 def make_api_request(url, pat, method='GET', data=None, timeout=50):
     """Reusable API request function with retry logic and timeout handling."""
-    auth = HTTPBasicAuth('', pat)
-    session = requests.Session()
-    retries = Retry(total=3, backoff_factor=0.3, status_forcelist=[429, 500, 502, 503, 504])
-    session.mount('https://', HTTPAdapter(max_retries=retries))
-
     try:
         if method == 'GET':
-            response = session.get(url, auth=auth, timeout=timeout)
+            response = http_client.get(url, pat, timeout=timeout)
         elif method == 'POST':
-            response = session.post(url, json=data, auth=auth, timeout=timeout)
+            response = http_client.post(url, pat, json=data, timeout=timeout)
         else:
             raise ValueError(f"Unsupported method: {method}")
         
@@ -182,8 +176,12 @@ def process_row(devops_server_url, project, token, api_version='6.0'):
     if work_item_ids:
         details_response = get_work_item_details(base_url, project, work_item_ids, pat, api_version)
         if details_response:
-            for work_item in details_response:
-                comments = get_work_item_comments(base_url, project, work_item['id'], pat, api_version)
+            # Fetch the comments of every work item concurrently
+            all_comments = async_engine.fan_out(
+                base_url,
+                lambda work_item: get_work_item_comments(base_url, project, work_item['id'], pat, api_version),
+                details_response)
+            for work_item, comments in zip(details_response, all_comments):
                 info = extract_work_item_info(collection_name, project_name, work_item, comments)
                 work_item_details_list.append(info)
                 work_item_type = info['Type']
@@ -318,7 +316,26 @@ def generate_report(output_dir, project, work_item_details_list, work_item_type_
                     worksheet.write(row, col, cell_value, workbook.add_format({'border': 1}))
         worksheet.hide_gridlines(2)  # Hide gridlines
         set_column_widths(worksheet, report_df)
-        
+
+        # Write per-endpoint request metrics with formatting
+        performance_df = pd.DataFrame(metrics.snapshot(), columns=metrics.PERFORMANCE_COLUMNS)
+        performance_df.to_excel(writer, sheet_name='Performance', index=False)
+        worksheet = writer.sheets['Performance']
+        for col_num, value in enumerate(performance_df.columns.values):
+            worksheet.write(0, col_num, value, header_format)
+        for row in range(1, len(performance_df) + 1):
+            for col in range(len(performance_df.columns)):
+                cell_value = performance_df.iloc[row - 1, col]
+                if pd.isna(cell_value):
+                    worksheet.write_blank(row, col, None, workbook.add_format({'border': 1}))
+                elif col == 0:
+                    worksheet.write(row, col, cell_value, workbook.add_format({'border': 1}))
+                else:
+                    worksheet.write(row, col, cell_value, right_align_format)
+        worksheet.hide_gridlines(2)  # Hide gridlines
+        set_column_widths(worksheet, performance_df)
+
+    metrics.write_json(metrics.sidecar_path(report_filename))
     logger.info(f'Report generated for {project}: {report_filename}')
 
 
@@ -327,6 +344,8 @@ def main():
     try:
         run_id = str(int(datetime.now().strftime("%Y%m%d%H%M%S")))
         output_directory = os.path.join("Work Items", run_id)
+        # Responses of earlier runs are revalidated with their ETags instead of downloaded again
+        response_cache.enable()
 
         # Create output directory if it doesn't exist
         if not os.path.exists(output_directory):
@@ -337,6 +356,8 @@ def main():
         df['Server URL'] = df['Server URL'].str.strip().fillna('')
         df['Project Name'] = df['Project Name'].str.strip().fillna('')
         df['PAT'] = df['PAT'].str.strip().fillna('')
+        apply_concurrency_settings(df)
+        apply_token_pools(df)
 
         # Form the input data in below format
         # Sample: { "server_url": { "pat": "123test_token", "projects": ['dev_server', 'qa_server'] }
@@ -347,7 +368,7 @@ def main():
                 continue
             server_url = row['Server URL']
             proj_name = row['Project Name']
-            ptoken = row['PAT']
+            ptoken = primary_pat(row['PAT'])
             proj_names = []
             if not proj_name:
                 proj_names = get_project_names(devops_server_url=server_url, pat=ptoken)
@@ -375,6 +396,7 @@ def main():
                     # Clear the metadata
                     del work_item_details_list
                     del work_item_type_counts
+                    metrics.reset()
                 except Exception as e:
                     logger.error(f"Error occurred while processing project '{project}': {e}")
     except Exception as e: